@@ -0,0 +1,304 @@
+"""Process images inside ZIP and TAR archives without extracting them.
+
+Members are read from the input archive one at a time, cropped/mirrored in
+memory and written straight into the output archive, so a multi-GB bundle
+never touches the disk as loose files. Either side may also be a plain
+folder, e.g. to pack a folder of results or to unpack while processing.
+TAR input is read as a stream, so compressed tarballs are decoded in a
+single forward pass.
+"""
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path, PurePosixPath
+from typing import Iterator
+
+from image_processor import (
+    DEFAULT_EXTENSIONS,
+    DEFAULT_PROFILE,
+    BatchStats,
+    ProcessResult,
+    _batch_options,
+    _decode_step,
+    _DiscoveryCounter,
+    _encode_step,
+    _format_for_path,
+    _multi_frame_step,
+    _partial_path,
+    _timed,
+    _transform_outputs,
+    _write_atomic,
+    discover_images,
+)
+
+_TAR_WRITE_MODES = {
+    ".tar": "w|",
+    ".tgz": "w|gz",
+    ".gz": "w|gz",
+    ".tbz2": "w|bz2",
+    ".bz2": "w|bz2",
+    ".txz": "w|xz",
+    ".xz": "w|xz",
+}
+
+# Already-compressed formats are stored; deflating them wastes CPU for ~0% gain
+_STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def is_archive(path) -> bool:
+    """Return True if path names a ZIP or TAR archive (existing or to be created)."""
+    name = Path(path).name.lower()
+    return name.endswith(".zip") or any(name.endswith(suffix) for suffix in _TAR_WRITE_MODES)
+
+
+def _safe_member_name(name: str) -> PurePosixPath:
+    """Reject absolute or parent-relative member names (zip-slip)."""
+    member = PurePosixPath(name.replace("\\", "/"))
+    if member.is_absolute() or ".." in member.parts or not member.parts:
+        raise ValueError(f"unsafe archive member name: {name!r}")
+    return member
+
+
+def iter_members(source, extensions: list = None) -> Iterator[tuple]:
+    """
+    Yield (name, data, mtime) for each image in an archive or folder.
+
+    Args:
+        source: ZIP file, TAR file (optionally gz/bz2/xz compressed) or folder
+        extensions: File extensions to match, case-insensitively
+            (default: common image formats)
+
+    Yields:
+        Tuple of (member name as a POSIX path, file bytes, mtime in seconds)
+
+    Raises:
+        ValueError: If source is a file but not a readable ZIP or TAR archive
+    """
+    suffixes = {ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS)}
+
+    def wanted(name):
+        return os.path.splitext(name)[1].lower() in suffixes
+
+    source = Path(source)
+    if source.is_dir():
+        for path in discover_images(source, extensions, recursive=True):
+            yield path.relative_to(source).as_posix(), path.read_bytes(), path.stat().st_mtime
+        return
+    try:
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and wanted(info.filename):
+                        yield info.filename, archive.read(info), time.mktime(info.date_time + (0, 0, -1))
+        elif tarfile.is_tarfile(source):
+            # Stream mode reads forward only, so compressed tarballs are never seeked
+            with tarfile.open(source, "r|*") as archive:
+                for member in archive:
+                    if member.isfile() and wanted(member.name):
+                        yield member.name, archive.extractfile(member).read(), member.mtime
+        else:
+            raise ValueError(f"not a folder, ZIP or TAR archive: {source}")
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error) as e:
+        # Truncated or corrupt archives are bad input, like any other ValueError
+        raise ValueError(f"unreadable archive {source}: {e}") from e
+
+
+class ArchiveWriter:
+    """
+    Sink for processed images: a ZIP, a TAR (by extension) or a folder.
+
+    Archives are built under a temporary name and renamed into place by
+    close(), so an interrupted run never leaves a truncated archive.
+    """
+
+    def __init__(self, target):
+        self.target = Path(target)
+        self._archive = None
+        self._temp = None
+        name = self.target.name.lower()
+        if not is_archive(self.target):
+            self.target.mkdir(parents=True, exist_ok=True)
+            return
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        self._temp = _partial_path(self.target)
+        try:
+            if name.endswith(".zip"):
+                self._archive = zipfile.ZipFile(str(self._temp), "w")
+            else:
+                mode = next(mode for suffix, mode in _TAR_WRITE_MODES.items() if name.endswith(suffix))
+                self._archive = tarfile.open(str(self._temp), mode)
+        except BaseException:
+            self._temp.unlink(missing_ok=True)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(discard=exc_type is not None)
+
+    def write(self, name: str, data, mtime: float = None) -> None:
+        """Add one file; name is a POSIX path relative to the archive root."""
+        mtime = time.time() if mtime is None else mtime
+        if self._archive is None:
+            _write_atomic(self.target / name, data)
+        elif isinstance(self._archive, zipfile.ZipFile):
+            info = zipfile.ZipInfo(name, time.localtime(max(mtime, 315532800))[:6])  # ZIP dates start in 1980
+            stored = os.path.splitext(name)[1].lower() in _STORED_SUFFIXES
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            self._archive.writestr(info, bytes(data))
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(mtime)
+            self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self, discard: bool = False) -> None:
+        """Finish the archive, or delete it if discard is True."""
+        if self._archive is None:
+            return
+        self._archive.close()
+        self._archive = None
+        if discard:
+            self._temp.unlink(missing_ok=True)
+        else:
+            os.replace(self._temp, self.target)
+
+
+def _process_member(name: str, data: bytes, options: dict) -> tuple:
+    """
+    Crop/mirror one member in memory; runs inside pool workers.
+
+    Returns:
+        Tuple of (ProcessResult, list of (output name, encoded bytes))
+    """
+    result = ProcessResult(Path(name), "ok", bytes_read=len(data))
+    start = time.perf_counter()
+    outputs = []
+    try:
+        member = _safe_member_name(name)
+        if options.get("output_suffix"):
+            member = member.with_suffix(options["output_suffix"])
+        result.output_path = Path(member)
+        if options.get("variants"):
+            options = {**options, "variant_outputs": [variant["name"] / member for variant in options["variants"]]}
+        # Animations and multi-page files keep every frame
+        buffer = io.BytesIO()
+        if _multi_frame_step(result, data, buffer, options, format=_format_for_path(member)):
+            outputs.append((member.as_posix(), buffer.getvalue()))
+        else:
+            img = _decode_step(result, data)
+            for target, processed in _transform_outputs(result, img, member, options):
+                outputs.append((target.as_posix(), _encode_step(result, processed, target, options).getvalue()))
+    except Exception as e:
+        result.status = "failed"
+        result.output_path = None
+        result.error = e
+        outputs = []
+    result.elapsed = time.perf_counter() - start
+    return result, outputs
+
+
+def iter_process_archive(
+    source,
+    target,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    extensions: list = None,
+    workers: int = 1,
+    executor: str = "thread",
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    output_format: str = None,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+    stats: BatchStats = None,
+    progress_callback=None,
+    cancel_event: threading.Event = None,
+) -> Iterator[ProcessResult]:
+    """
+    Process every image in an archive (or folder) into an archive (or folder).
+
+    Nothing is extracted to disk: each member is read into memory,
+    transformed, encoded and appended to the output. At most workers * 2
+    members are held in memory at once. Non-image members are skipped.
+
+    Args:
+        source: Input ZIP, TAR/TAR.GZ/TAR.BZ2/TAR.XZ file or folder
+        target: Output path; .zip, .tar, .tar.gz/.tgz, .tar.bz2/.tbz2 or
+            .tar.xz/.txz create an archive, anything else is a folder
+        top_pixels: Pixels to crop from top
+        bottom_pixels: Pixels to crop from bottom
+        left_pixels: Pixels to crop from left
+        right_pixels: Pixels to crop from right
+        extensions: List of file extensions to process (default: common image formats)
+        workers: Members to process concurrently (None uses all CPUs)
+        executor: "thread" (default) or "process" when workers > 1
+        progress_callback: Optional callback function(current, total, name);
+            total is None until the whole input has been read
+        cancel_event: threading.Event; once set, no further members are
+            started and the output is finished with those already done
+
+        The remaining options are described in iter_process_images.
+
+    Yields:
+        ProcessResult for each member; path and output_path are member
+        names inside the input and output
+    """
+    options = _batch_options(
+        top_pixels, bottom_pixels, left_pixels, right_pixels,
+        backend, preserve_mode, False, False, output_format, profile, variants,
+    )
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor not in ("thread", "process"):
+        raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+
+    members = _DiscoveryCounter(iter_members(source, extensions))
+
+    def processed():
+        # Yields (result, outputs, mtime) in completion order
+        if workers <= 1:
+            for name, data, mtime in members:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield (*_process_member(name, data, options), mtime)
+            return
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=workers) as pool:
+            pending = {}
+            member_iter = iter(members)
+            while True:
+                for name, data, mtime in member_iter:
+                    pending[pool.submit(_process_member, name, data, options)] = mtime
+                    if len(pending) >= workers * 2 or (cancel_event is not None and cancel_event.is_set()):
+                        break
+                if cancel_event is not None and cancel_event.is_set():
+                    member_iter = iter(())
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield (*future.result(), pending.pop(future))
+
+    with ArchiveWriter(target) as writer:
+        try:
+            for idx, (result, outputs, mtime) in enumerate(processed(), 1):
+                with _timed(result, "write"):
+                    for name, data in outputs:
+                        writer.write(name, data, mtime)
+                if stats is not None:
+                    stats.add(result)
+                if progress_callback:
+                    progress_callback(idx, members.total, result.path.as_posix())
+                yield result
+        finally:
+            if stats is not None:
+                stats.finish()
@@ -0,0 +1,174 @@
+"""asyncio counterparts of the blocking processing API.
+
+Every call hands its file I/O and pixel work to an executor, so the event
+loop keeps serving other tasks while images are processed. The work goes
+to the loop's default thread pool unless an executor is passed; Pillow
+releases the GIL while decoding and encoding, so threads already run in
+parallel, and a ProcessPoolExecutor works as well. Discovery and manifest
+checks always run via asyncio.to_thread, since the manifest lives in this
+process.
+
+aiter_process_images keeps at most limit files in flight and yields
+results as they complete. An asyncio.Semaphore passed as semaphore caps
+several concurrent calls together. Cancelling the consuming task (or
+setting cancel_event) stops new files from starting; files already being
+written finish normally, since their outputs are renamed into place
+atomically either way.
+"""
+import asyncio
+import threading
+from concurrent.futures import Executor
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator
+
+from image_processor import (
+    DEFAULT_PROFILE,
+    BatchStats,
+    ProcessManifest,
+    ProcessResult,
+    _batch_options,
+    _plan_jobs,
+    _process_file,
+    crop_and_mirror,
+    discover_images,
+    transform_image,
+)
+
+
+async def crop_and_mirror_async(image_path, *args, executor: Executor = None, **kwargs):
+    """Run crop_and_mirror in executor; takes the same arguments."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(crop_and_mirror, image_path, *args, **kwargs))
+
+
+async def transform_image_async(source, *args, executor: Executor = None, **kwargs):
+    """Run transform_image in executor; takes the same arguments."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(transform_image, source, *args, **kwargs))
+
+
+async def aiter_process_images(
+    input_folder: str,
+    output_folder: str,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    extensions: list = None,
+    limit: int = 4,
+    executor: Executor = None,
+    semaphore: asyncio.Semaphore = None,
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    incremental: bool = False,
+    hash_contents: bool = False,
+    lossless_jpeg: bool = False,
+    recursive: bool = False,
+    large_images: bool = False,
+    output_format: str = None,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+    stats: BatchStats = None,
+    cancel_event: threading.Event = None,
+) -> AsyncIterator[ProcessResult]:
+    """
+    Process all images in a folder, yielding each result as it completes.
+
+    Args:
+        input_folder: Path to input folder containing images
+        output_folder: Path to output folder for processed images
+        top_pixels: Pixels to crop from top
+        bottom_pixels: Pixels to crop from bottom
+        left_pixels: Pixels to crop from left
+        right_pixels: Pixels to crop from right
+        extensions: List of file extensions to process (default: common image formats)
+        limit: Most files this call has in flight at once
+        executor: concurrent.futures executor for the per-file work
+            (default: the event loop's default thread pool)
+        semaphore: asyncio.Semaphore every file must hold while it is
+            processed; share one between calls to cap them together
+        stats: BatchStats to add every result to
+        cancel_event: threading.Event; once set, no further files are
+            started and iteration ends after the files in flight finish
+
+        The remaining options are described in iter_process_images.
+
+    Yields:
+        ProcessResult for each file, in completion order
+    """
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1, not {limit}")
+    loop = asyncio.get_running_loop()
+    input_path = Path(input_folder)
+    output_path = Path(output_folder)
+    options = _batch_options(
+        top_pixels, bottom_pixels, left_pixels, right_pixels,
+        backend, preserve_mode, lossless_jpeg, large_images, output_format, profile, variants,
+    )
+    await asyncio.to_thread(output_path.mkdir, parents=True, exist_ok=True)
+    manifest = await asyncio.to_thread(ProcessManifest, input_path, output_path, hash_contents)
+
+    signatures = {}  # Manifest signatures of files currently in flight
+    image_files = discover_images(input_path, extensions, recursive, exclude=output_path)
+    plan = _plan_jobs(image_files, input_path, output_path, options, manifest, incremental, signatures, cancel_event)
+
+    async def run(job):
+        if semaphore is None:
+            return await loop.run_in_executor(executor, _process_file, *job)
+        async with semaphore:
+            return await loop.run_in_executor(executor, _process_file, *job)
+
+    pending = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < limit:
+                # Each step stats (or hashes) a file, so it runs off the loop too
+                job = await asyncio.to_thread(next, plan, None)
+                if job is None:
+                    exhausted = True
+                elif isinstance(job, ProcessResult):
+                    # Skipped or unreadable; already finished, but reported in turn
+                    future = loop.create_future()
+                    future.set_result(job)
+                    pending.add(future)
+                else:
+                    pending.add(asyncio.ensure_future(run(job)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                signature = signatures.pop(result.path, None)
+                if result.ok and signature is not None:
+                    await asyncio.to_thread(manifest.record, result.path, result.output_path, options, signature)
+                if stats is not None:
+                    stats.add(result)
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        manifest.close()
+        if stats is not None:
+            stats.finish()
+
+
+async def batch_process_images_async(input_folder: str, output_folder: str, *args, **kwargs) -> tuple:
+    """
+    Await a whole folder; takes the same arguments as aiter_process_images.
+
+    Returns:
+        Tuple of (successful_count, failed_count, error_messages), as
+        batch_process_images does
+    """
+    successful = 0
+    failed = 0
+    errors = []
+    async for result in aiter_process_images(input_folder, output_folder, *args, **kwargs):
+        if result.status == "failed":
+            failed += 1
+            errors.append(f"{result.path.name}: {str(result.error)}")
+        else:
+            successful += 1
+    return successful, failed, errors
@@ -0,0 +1,279 @@
+"""Band-only crop and mirror for uncompressed raster files (TIFF, BMP, PPM/PGM).
+
+Only the four edge bands change, so instead of decoding the whole image the
+input file is copied to the output as-is and the bands are then patched in
+place row by row. Memory use is proportional to one row of a band rather
+than to the full frame, which keeps gigapixel scans within reach.
+
+Where possible the copy is done by the kernel (copy_file_range, which
+clones the data outright on copy-on-write filesystems) and the bands are
+moved directly between memory maps of the two files, so pixel data is
+never copied into Python objects and only the pages holding band pixels
+are touched. Pillow is used only to parse headers; pixels are never decoded.
+"""
+import bisect
+import mmap
+import os
+import shutil
+from functools import lru_cache
+from typing import Optional
+
+from PIL import BmpImagePlugin, Image, PpmImagePlugin, TiffImagePlugin
+
+# Header parsers tried in order; they read only the header, never the pixels
+_RAW_PLUGINS = (
+    TiffImagePlugin.TiffImageFile,
+    BmpImagePlugin.BmpImageFile,
+    PpmImagePlugin.PpmImageFile,
+)
+
+
+def band_moves(size: tuple, top_pixels: int, bottom_pixels: int, left_pixels: int, right_pixels: int) -> list:
+    """
+    Describe the crop/mirror as a list of band moves.
+
+    Args:
+        size: (width, height) of the image
+        top_pixels: Pixels to crop from top and mirror to bottom
+        bottom_pixels: Pixels to crop from bottom and mirror to top
+        left_pixels: Pixels to crop from left and mirror to right
+        right_pixels: Pixels to crop from right and mirror to left
+
+    Returns:
+        List of ((x0, y0, x1, y1) source box, (x, y) destination) pairs, in
+        the order they must be applied. Every source box refers to the
+        original pixels, and later moves overwrite earlier ones.
+    """
+    width, height = size
+    top_pixels = max(0, min(top_pixels, height // 2))
+    bottom_pixels = max(0, min(bottom_pixels, height // 2))
+    left_pixels = max(0, min(left_pixels, width // 2))
+    right_pixels = max(0, min(right_pixels, width // 2))
+
+    moves = []
+    if top_pixels:
+        moves.append(((0, 0, width, top_pixels), (0, height - top_pixels)))
+    if bottom_pixels:
+        moves.append(((0, height - bottom_pixels, width, height), (0, 0)))
+    if left_pixels:
+        moves.append(((0, 0, left_pixels, height), (width - left_pixels, 0)))
+    if right_pixels:
+        moves.append(((width - right_pixels, 0, width, height), (0, 0)))
+    return moves
+
+
+@lru_cache(maxsize=None)
+def _bytes_per_pixel(mode: str, rawmode: str) -> Optional[int]:
+    """
+    Return how many bytes one pixel occupies in rawmode, or None if pixels
+    are not byte-aligned (e.g. 1- or 4-bit packing).
+    """
+    # Pillow has no public bits-per-rawmode lookup, so probe the unpacker
+    # for the smallest buffer it accepts for a row of 8 pixels
+    for size in range(1, 129):
+        try:
+            Image.frombytes(mode, (8, 1), b"\0" * size, "raw", rawmode)
+        except ValueError:
+            continue
+        return size // 8 if size % 8 == 0 else None
+    return None
+
+
+class RawLayout:
+    """
+    Byte layout of an uncompressed raster file.
+
+    Built from Pillow's tile descriptors, so striped and tiled TIFFs as well
+    as top-down and bottom-up BMPs are handled the same way.
+    """
+
+    def __init__(self, size: tuple, bytes_per_pixel: int, tiles: list):
+        self.size = size
+        self.bytes_per_pixel = bytes_per_pixel
+        # Group tiles into horizontal rows of tiles, each sorted by x
+        rows = {}
+        for tile in tiles:
+            x0, y0, x1, y1 = tile[0]
+            rows.setdefault((y0, y1), []).append(tile)
+        self._row_bounds = sorted(rows)
+        self._row_starts = [y0 for y0, _ in self._row_bounds]
+        self._rows = [sorted(rows[bounds], key=lambda tile: tile[0][0]) for bounds in self._row_bounds]
+
+    @classmethod
+    def open(cls, path) -> Optional["RawLayout"]:
+        """Return the layout of path, or None if it is not an uncompressed raster."""
+        with open(path, "rb") as fp:
+            img = None
+            for plugin in _RAW_PLUGINS:
+                fp.seek(0)
+                try:
+                    img = plugin(fp)
+                    break
+                except Exception:
+                    continue
+            if img is None or getattr(img, "n_frames", 1) != 1:
+                return None
+
+            tiles = []
+            bytes_per_pixel = None
+            for tile in img.tile:
+                if tile[0] != "raw":
+                    return None
+                args = tile[3] if isinstance(tile[3], tuple) else (tile[3],)
+                rawmode = args[0]
+                stride = args[1] if len(args) > 1 else 0
+                ystep = args[2] if len(args) > 2 else 1
+                tile_bpp = _bytes_per_pixel(img.mode, rawmode)
+                if tile_bpp is None or bytes_per_pixel not in (None, tile_bpp):
+                    return None
+                bytes_per_pixel = tile_bpp
+                x0, y0, x1, y1 = tile[1]
+                tiles.append(((x0, y0, x1, y1), tile[2], stride or (x1 - x0) * tile_bpp, ystep < 0))
+            if bytes_per_pixel is None:
+                return None
+
+            # Planar TIFFs list one tile per band for the same box
+            if len({tile[0] for tile in tiles}) != len(tiles):
+                return None
+            return cls(img.size, bytes_per_pixel, tiles)
+
+    def segments(self, y: int, x0: int, x1: int) -> list:
+        """Return (file offset, byte count) runs holding pixels x0..x1 of row y."""
+        row = bisect.bisect_right(self._row_starts, y) - 1
+        tile_y0, tile_y1 = self._row_bounds[row]
+        runs = []
+        for (bx0, _, bx1, _), offset, stride, bottom_up in self._rows[row]:
+            start, stop = max(x0, bx0), min(x1, bx1)
+            if start >= stop:
+                continue
+            line = (tile_y1 - 1 - y) if bottom_up else (y - tile_y0)
+            runs.append((offset + line * stride + (start - bx0) * self.bytes_per_pixel,
+                         (stop - start) * self.bytes_per_pixel))
+        return runs
+
+
+def _copy_file(source, target) -> None:
+    """Copy source to target, letting the kernel move (or clone) the data if it can."""
+    if not hasattr(os, "copy_file_range"):
+        shutil.copyfile(source, target)
+        return
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), min(remaining, 1 << 30))
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError:
+            remaining = -1  # e.g. EXDEV on older kernels, or a filesystem without support
+        if remaining:
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def _copy_runs(source: memoryview, target: mmap.mmap, runs: list, dest_runs: list) -> None:
+    """Copy the bytes of runs into dest_runs, which cover the same number of bytes."""
+    dest = iter(dest_runs)
+    dest_offset, dest_length = 0, 0
+    for offset, length in runs:
+        while length:
+            if not dest_length:
+                dest_offset, dest_length = next(dest)
+            count = min(length, dest_length)
+            # Slices of a memoryview share the mapped pages: a single memcpy
+            target[dest_offset:dest_offset + count] = source[offset:offset + count]
+            offset += count
+            length -= count
+            dest_offset += count
+            dest_length -= count
+
+
+def _patch_mapped(source: memoryview, target: mmap.mmap, layout: RawLayout, moves: list) -> None:
+    """Apply band moves between a view of the input's memory map and the output's map."""
+    for (x0, y0, x1, y1), (dest_x, dest_y) in moves:
+        for row in range(y1 - y0):
+            # Strips, BMP and PPM rows are one run each side; tiled rows split
+            # at different tile edges on each side, so runs are copied pairwise
+            runs = layout.segments(y0 + row, x0, x1)
+            dest_runs = layout.segments(dest_y + row, dest_x, dest_x + (x1 - x0))
+            _copy_runs(source, target, runs, dest_runs)
+
+
+def _map(fp, access: int) -> Optional[mmap.mmap]:
+    """Map all of fp, or return None if it cannot be mapped."""
+    try:
+        return mmap.mmap(fp.fileno(), 0, access=access)
+    except (OSError, ValueError):  # e.g. no mmap support, or too large for a 32-bit address space
+        return None
+
+
+def _patch_files(src, dst, layout: RawLayout, moves: list) -> None:
+    """Apply band moves with seek/read/write, for files that cannot be mapped."""
+    for (x0, y0, x1, y1), (dest_x, dest_y) in moves:
+        for row in range(y1 - y0):
+            # Gather one source row, then scatter it over the destination row
+            chunk = bytearray()
+            for offset, length in layout.segments(y0 + row, x0, x1):
+                src.seek(offset)
+                chunk += src.read(length)
+            position = 0
+            for offset, length in layout.segments(dest_y + row, dest_x, dest_x + (x1 - x0)):
+                dst.seek(offset)
+                dst.write(chunk[position:position + length])
+                position += length
+
+
+def stream_crop_and_mirror(
+    image_path,
+    output_path,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+) -> bool:
+    """
+    Crop and mirror an uncompressed raster file without decoding it.
+
+    The file is copied to output_path unchanged, then each band is copied
+    a row at a time from a memory map of the input over its destination in
+    a memory map of the output (or with seek/read/write if the files
+    cannot be mapped). Mode, palette and all metadata are preserved byte
+    for byte.
+
+    Args:
+        image_path: Uncompressed TIFF, BMP or PPM/PGM file
+        output_path: Where to write the result (same format as the input)
+        top_pixels: Pixels to crop from top and mirror to bottom
+        bottom_pixels: Pixels to crop from bottom and mirror to top
+        left_pixels: Pixels to crop from left and mirror to right
+        right_pixels: Pixels to crop from right and mirror to left
+
+    Returns:
+        True if output_path was written, False if the file's layout is not
+        supported (compressed, multi-frame or bit-packed); nothing is
+        written in that case
+    """
+    layout = RawLayout.open(image_path)
+    if layout is None:
+        return False
+
+    moves = band_moves(layout.size, top_pixels, bottom_pixels, left_pixels, right_pixels)
+    _copy_file(image_path, output_path)
+    if not moves:
+        return True
+    with open(image_path, "rb") as src, open(output_path, "r+b") as dst:
+        source = _map(src, mmap.ACCESS_READ)
+        target = _map(dst, mmap.ACCESS_WRITE) if source is not None else None
+        if target is None:
+            if source is not None:
+                source.close()
+            _patch_files(src, dst, layout, moves)
+            return True
+        # No msync: like write(), the pages reach the disk with the page cache.
+        # The view is released before the maps close, as mmap.close() requires
+        with source, target, memoryview(source) as view:
+            _patch_mapped(view, target, layout, moves)
+    return True
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the image processor.
+
+Generates a reproducible synthetic corpus, times crop_and_mirror and
+batch_process_images across backends and worker modes, and writes the
+results as JSON so runs can be compared between releases.
+
+Run: python benchmark.py --output bench.json [--quick]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from PIL import Image
+
+import image_processor
+
+FORMATS = ["jpg", "png", "tiff", "bmp", "gif"]
+SIZES = {"small": (640, 480), "medium": (1920, 1080), "large": (4000, 3000)}
+QUICK_SIZES = {"small": (320, 240), "medium": (1024, 768)}
+CROPS = {"edges": (16, 16, 16, 16), "wide": (120, 60, 90, 30)}
+
+
+def generate_corpus(folder: str, sizes: dict, formats: list, count: int, seed: int = 0) -> list:
+    """
+    Write a reproducible set of test images to folder.
+
+    Each image is smooth random content (upscaled noise), so the codecs see
+    realistic rather than worst-case data. The same seed always produces
+    the same files.
+
+    Returns:
+        List of generated file paths
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    files = []
+    for size_name, (width, height) in sizes.items():
+        for idx in range(count):
+            small = (max(1, width // 16), max(1, height // 16))
+            noise = bytes(rng.getrandbits(8) for _ in range(small[0] * small[1] * 3))
+            img = Image.frombytes("RGB", small, noise).resize((width, height), Image.BICUBIC)
+            for fmt in formats:
+                path = folder / f"{size_name}_{idx}.{fmt}"
+                if fmt == "jpg":
+                    img.save(path, quality=90)
+                else:
+                    img.save(path)
+                files.append(path)
+    return files
+
+
+def _peak_rss_mb() -> dict:
+    """Peak resident set size of this process and its children, in MB."""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _summarize(name: str, latencies: list, bytes_in: int, seconds: float, **details) -> dict:
+    return {
+        "name": name,
+        **details,
+        "images": len(latencies),
+        "bytes_in": bytes_in,
+        "seconds": seconds,
+        "images_per_sec": len(latencies) / seconds if seconds else None,
+        "mb_per_sec": bytes_in / seconds / 1e6 if seconds else None,
+        "p50_ms": _percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_crop_and_mirror(files: list, crop: tuple, backend: str, repeat: int) -> dict:
+    """Time crop_and_mirror (decode + transform) on every file."""
+    latencies = []
+    bytes_in = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            file_start = time.perf_counter()
+            image_processor.crop_and_mirror(str(path), *crop, backend=backend)
+            latencies.append(time.perf_counter() - file_start)
+            bytes_in += os.path.getsize(path)
+    return _summarize("crop_and_mirror", latencies, bytes_in, time.perf_counter() - start, backend=backend)
+
+
+def bench_batch(input_folder: str, crop: tuple, workers: int, executor: str, backend: str,
+                profile: str = image_processor.DEFAULT_PROFILE) -> dict:
+    """Time a full iter_process_images run (decode, transform, encode, write)."""
+    latencies = []
+    bytes_in = 0
+    bytes_out = 0
+    encode_seconds = 0.0
+    with tempfile.TemporaryDirectory(prefix="image_cropper_bench_") as output_folder:
+        start = time.perf_counter()
+        for result in image_processor.iter_process_images(
+            input_folder, output_folder, *crop, workers=workers, executor=executor, backend=backend,
+            profile=profile,
+        ):
+            latencies.append(result.elapsed)
+            bytes_in += result.path.stat().st_size
+            bytes_out += result.bytes_written
+            encode_seconds += result.timings.get("encode", 0.0)
+        seconds = time.perf_counter() - start
+    return _summarize(
+        "batch_process_images", latencies, bytes_in, seconds,
+        workers=workers, executor=executor, backend=backend, profile=profile,
+        bytes_out=bytes_out, encode_seconds=encode_seconds,
+    )
+
+
+def _run_case(case: dict) -> dict:
+    # Runs in a fresh process so peak RSS belongs to this case alone
+    crop = CROPS[case["crop"]]
+    if case["kind"] == "crop_and_mirror":
+        files = sorted(Path(case["folder"]).glob(f"*.{case['format']}"))
+        result = bench_crop_and_mirror(files, crop, case["backend"], case["repeat"])
+    else:
+        result = bench_batch(case["folder"], crop, case["workers"], case["executor"], case["backend"],
+                             case.get("profile", image_processor.DEFAULT_PROFILE))
+    result.update(format=case.get("format"), crop=case["crop"])
+    return result
+
+
+def run_benchmarks(corpus_folder: str, quick: bool = False, workers: int = None, repeat: int = 3) -> list:
+    """Run every benchmark case against corpus_folder and return their results."""
+    workers = workers or os.cpu_count() or 1
+    backends = ["pillow"]
+    try:
+        import numpy  # noqa: F401
+        backends.append("numpy")
+    except ImportError:
+        pass
+
+    cases = []
+    for crop in CROPS:
+        for fmt in FORMATS:
+            for backend in backends:
+                cases.append({"kind": "crop_and_mirror", "folder": corpus_folder, "format": fmt,
+                              "backend": backend, "crop": crop, "repeat": 1 if quick else repeat})
+        modes = [(1, "process"), (workers, "thread"), (workers, "process"), (workers, "pipeline")]
+        for mode_workers, executor in modes:
+            cases.append({"kind": "batch", "folder": corpus_folder, "workers": mode_workers,
+                          "executor": executor, "backend": "pillow", "crop": crop})
+        # Encode time against output size for each encoder profile
+        for profile in image_processor.ENCODER_PROFILES:
+            if profile != image_processor.DEFAULT_PROFILE:
+                cases.append({"kind": "batch", "folder": corpus_folder, "workers": 1, "executor": "process",
+                              "backend": "pillow", "crop": crop, "profile": profile})
+
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(_run_case, case).result()
+        mode = f"{case['executor']} x{case['workers']}" if case["kind"] == "batch" else case["backend"]
+        if case.get("profile"):
+            mode = case["profile"]
+        print(f"  {result['name']:<22} {result.get('format') or 'all':<5} {result['crop']:<6} "
+              f"{mode:<12} {result['images_per_sec']:8.1f} img/s p95 {result['p95_ms']:8.1f} ms",
+              file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", "-o", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--corpus", help="Reuse or create the corpus in this folder")
+    parser.add_argument("--quick", action="store_true", help="Small corpus and single repeat")
+    parser.add_argument("--count", type=int, default=None, help="Images per size (default: 2, or 1 with --quick)")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size for parallel modes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    count = args.count or (1 if args.quick else 2)
+    with tempfile.TemporaryDirectory(prefix="image_cropper_corpus_") as temp_dir:
+        corpus = args.corpus or temp_dir
+        if not any(Path(corpus).glob("*")):
+            print(f"Generating corpus in {corpus}...", file=sys.stderr)
+            generate_corpus(corpus, sizes, FORMATS, count, args.seed)
+        results = run_benchmarks(corpus, quick=args.quick, workers=args.workers)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "sizes": sizes,
+            "count": count,
+            "crops": CROPS,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
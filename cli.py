@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Command-line front end for batch cropping and mirroring, for scripts,
+cron jobs and containers where no display is available.
+
+Never imports tkinter. Pillow and the image processor are imported only
+once the arguments have been parsed, so --help and usage errors return
+immediately.
+
+Run: python cli.py INPUT OUTPUT --top 50 --left 20 [--json]
+     python cli.py INPUT OUTPUT --top 50 --watch   (until Ctrl+C)
+
+Exit codes:
+    0  every file was processed (or skipped as unchanged)
+    1  one or more files failed
+    2  invalid arguments
+    3  the input folder is missing or contains no images
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+EXIT_OK = 0
+EXIT_FAILED_FILES = 1
+EXIT_USAGE = 2
+EXIT_NO_IMAGES = 3
+
+
+def _non_negative(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {number}")
+    return number
+
+
+def _variant(value: str) -> dict:
+    """Parse NAME=TOP,BOTTOM,LEFT,RIGHT[@WIDTHxHEIGHT] into Variant fields."""
+    try:
+        name, spec = value.split("=", 1)
+        spec, _, size = spec.partition("@")
+        top, bottom, left, right = (_non_negative(part) for part in spec.split(","))
+        resize = tuple(int(part) for part in size.lower().split("x")) if size else None
+        if resize is not None and len(resize) != 2:
+            raise ValueError
+    except (ValueError, argparse.ArgumentTypeError):
+        raise argparse.ArgumentTypeError(f"expected NAME=TOP,BOTTOM,LEFT,RIGHT[@WIDTHxHEIGHT], not {value!r}")
+    return {"name": name, "top_pixels": top, "bottom_pixels": bottom, "left_pixels": left,
+            "right_pixels": right, "resize": resize}
+
+
+def _shard(value: str) -> tuple:
+    """Parse INDEX/COUNT, e.g. 0/4 for the first of four shards."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INDEX/COUNT such as 0/4, not {value!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be from 0 to {count - 1}, not {index}")
+    return index, count
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Crop pixels from each side of every image in a folder and mirror them to the opposite side.",
+    )
+    parser.add_argument("input", help="Folder, ZIP or TAR archive containing the images to process")
+    parser.add_argument("output", help="Folder to write processed images to, or a .zip/.tar[.gz|.bz2|.xz] to create")
+    parser.add_argument("--top", type=_non_negative, default=0, help="Pixels to crop from top")
+    parser.add_argument("--bottom", type=_non_negative, default=0, help="Pixels to crop from bottom")
+    parser.add_argument("--left", type=_non_negative, default=0, help="Pixels to crop from left")
+    parser.add_argument("--right", type=_non_negative, default=0, help="Pixels to crop from right")
+    parser.add_argument("--variant", type=_variant, action="append", dest="variants",
+                        metavar="NAME=T,B,L,R[@WxH]",
+                        help="Write a named variant to OUTPUT/NAME instead of a single result; repeat for several. "
+                             "Each input is decoded once for all variants")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Also process subfolders")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="Files to process concurrently (0 uses all CPUs; default: 1)")
+    parser.add_argument("--executor", choices=["process", "thread", "pipeline"], default="process",
+                        help="How files are processed concurrently (default: process)")
+    parser.add_argument("-f", "--format", dest="output_format", metavar="EXT",
+                        help="Write every output in this format, e.g. png or jpg (default: keep input format)")
+    parser.add_argument("--profile", choices=["fast", "balanced", "smallest"], default="balanced",
+                        help="Encoder settings: least encoding time, default, or smallest files (default: balanced)")
+    parser.add_argument("--ext", action="append", metavar="EXT",
+                        help="Only process this extension; repeat for several (default: common image formats)")
+    parser.add_argument("--backend", choices=["pillow", "numpy"], default="pillow")
+    parser.add_argument("--incremental", action="store_true", help="Skip files unchanged since the last run")
+    parser.add_argument("--hash-contents", action="store_true",
+                        help="With --incremental, compare file contents when timestamps differ")
+    parser.add_argument("--lossless-jpeg", action="store_true", help="Move JPEG blocks with jpegtran when aligned")
+    parser.add_argument("--large-images", action="store_true",
+                        help="Patch uncompressed TIFF/BMP/PPM files in place instead of decoding them")
+    parser.add_argument("--report", choices=["json", "csv"], help="Also write a report to the output folder")
+    parser.add_argument("--shard", type=_shard, metavar="INDEX/COUNT",
+                        help="Only process this machine's share of the input, e.g. 0/4 .. 3/4; "
+                             "combine the shards' reports with merge_shards.py")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process new or modified files as they arrive (implies --incremental)")
+    parser.add_argument("--settle", type=float, default=2.0, metavar="SECONDS",
+                        help="With --watch, how long a file must stop changing before it is processed (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, metavar="SECONDS",
+                        help="With --watch, seconds between folder scans (default: 1)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON on stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors and the summary")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_OK if e.code == 0 else EXIT_USAGE
+
+    if not Path(args.input).exists():
+        print(f"error: input folder does not exist: {args.input}", file=sys.stderr)
+        return EXIT_NO_IMAGES
+    if Path(args.input).is_file() and args.watch:
+        print("error: --watch needs an input folder, not an archive", file=sys.stderr)
+        return EXIT_USAGE
+    if args.shard and args.watch:
+        print("error: --shard cannot be combined with --watch", file=sys.stderr)
+        return EXIT_USAGE
+
+    # Deferred so that --help and usage errors don't pay for Pillow
+    from image_processor import BatchStats, iter_process_images
+
+    extensions = ["." + ext.lower().lstrip(".") for ext in args.ext] if args.ext else None
+    stats = BatchStats()
+    errors = []
+    # Options every mode understands; folder modes add their own below
+    options = dict(
+        top_pixels=args.top,
+        bottom_pixels=args.bottom,
+        left_pixels=args.left,
+        right_pixels=args.right,
+        extensions=extensions,
+        workers=args.workers or None,
+        backend=args.backend,
+        output_format=args.output_format,
+        profile=args.profile,
+        variants=args.variants,
+        stats=stats,
+    )
+    folder_options = dict(
+        executor=args.executor,
+        hash_contents=args.hash_contents,
+        lossless_jpeg=args.lossless_jpeg,
+        recursive=args.recursive,
+        large_images=args.large_images,
+    )
+    from archives import is_archive
+    if Path(args.input).is_file() or is_archive(args.output):
+        if args.shard:
+            print("error: --shard needs an input and output folder", file=sys.stderr)
+            return EXIT_USAGE
+        # Stream members between archives (or an archive and a folder) without extracting
+        from archives import iter_process_archive
+        executor = "process" if args.executor == "process" else "thread"
+        results = iter_process_archive(args.input, args.output, executor=executor, **options)
+    elif args.watch:
+        from watch import watch_images
+        results = watch_images(
+            args.input, args.output, settle_seconds=args.settle, poll_interval=args.poll_interval,
+            **options, **folder_options,
+        )
+    else:
+        shard_index, shard_count = args.shard or (0, 1)
+        results = iter_process_images(
+            args.input, args.output, incremental=args.incremental, report=args.report,
+            shard_index=shard_index, shard_count=shard_count,
+            **options, **folder_options,
+        )
+
+    try:
+        for result in results:
+            if result.status == "failed":
+                errors.append({"path": str(result.path), "error": str(result.error)})
+                print(f"failed: {result.path}: {result.error}", file=sys.stderr)
+            elif not args.quiet and not args.json:
+                latency = f" ({result.latency:.2f}s after arrival)" if result.latency is not None else ""
+                print(f"{result.status}: {result.path}{latency}", flush=args.watch)
+    except ValueError as e:
+        # Bad option values, e.g. an unknown --format, or an input that is not a readable archive
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+        results.close()  # Ctrl+C is the normal way to stop watching
+
+    summary = stats.as_dict()
+    summary["errors"] = errors
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        statuses = summary["statuses"]
+        print(f"{summary['files']} files: {statuses.get('ok', 0)} processed, "
+              f"{statuses.get('skipped', 0)} skipped, {statuses.get('failed', 0)} failed "
+              f"in {summary['wall_seconds']:.2f}s ({summary['images_per_sec']:.1f} images/sec)")
+
+    if not summary["files"] and not args.watch:
+        print(f"error: no images found in {args.input}", file=sys.stderr)
+        return EXIT_NO_IMAGES
+    return EXIT_FAILED_FILES if errors else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,570 @@
 """Image processing module for crop and mirror operations."""
 try:
-    from PIL import Image
+    from PIL import Image, TiffImagePlugin
 except ImportError as e:
     raise ImportError("Pillow library is required; install it with: pip install pillow") from e
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Iterator, Optional
+
+from band_stream import band_moves, stream_crop_and_mirror
+
+DEFAULT_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff"]
+MANIFEST_NAME = ".image_cropper_manifest.jsonl"
+REPORT_NAME = "image_cropper_report"  # .json summary or .csv per-file rows
+
+# Timed steps of processing one file, in order
+STAGES = ("read", "decode", "transform", "encode", "write")
+
+# Encoder settings per output format. Quality is the same in every profile,
+# so they trade encoding time against file size, never image quality.
+ENCODER_PROFILES = {
+    "fast": {
+        "JPEG": {"quality": 95},
+        "PNG": {"compress_level": 1},
+        "WEBP": {"quality": 95, "method": 0},
+    },
+    "balanced": {
+        "JPEG": {"quality": 95, "optimize": True},
+        "PNG": {"compress_level": 3},
+        "WEBP": {"quality": 95, "method": 4},
+    },
+    "smallest": {
+        "JPEG": {"quality": 95, "optimize": True, "progressive": True},
+        "PNG": {"compress_level": 9, "optimize": True},
+        "TIFF": {"compression": "tiff_adobe_deflate"},
+        "WEBP": {"quality": 95, "method": 6},
+        "GIF": {"optimize": True},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# Metadata carried over from the source image, per output format
+_METADATA_KEYS = {
+    "JPEG": ("exif", "icc_profile"),
+    "PNG": ("exif", "icc_profile"),
+    "TIFF": ("exif", "icc_profile"),
+    "WEBP": ("exif", "icc_profile"),
+}
+
+# Formats that can hold several frames (animations) or pages
+_MULTI_FRAME_FORMATS = {"GIF", "PNG", "TIFF", "WEBP"}
+
+# Keys of a batch's options dict that are crop_and_mirror keyword arguments
+_BAND_OPTIONS = ("top_pixels", "bottom_pixels", "left_pixels", "right_pixels")
+_CROP_OPTIONS = _BAND_OPTIONS + ("backend", "preserve_mode")
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of processing a single file."""
+    path: Path
+    status: str  # "ok", "failed" or "skipped" (unchanged since the last run)
+    output_path: Optional[Path] = None
+    bytes_written: int = 0
+    elapsed: float = 0.0
+    error: Optional[BaseException] = None
+    method: str = "pixel"  # "pixel" (decode/re-encode), "jpeg-lossless" or "band-stream"
+    bytes_read: int = 0
+    width: int = 0
+    height: int = 0
+    timings: dict = field(default_factory=dict)  # Seconds spent in each of STAGES
+    profile: Optional[str] = None  # Encoder profile used, if the file was re-encoded
+    latency: Optional[float] = None  # Watch mode: seconds from the input's last change to this result
+    frames: int = 1  # Frames or pages processed; width and height are the first one's
+    
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+@dataclass
+class Variant:
+    """
+    One named set of crop/mirror parameters for a multi-variant run.
+    
+    Each variant is written to its own subfolder of the output folder.
+    """
+    name: str
+    top_pixels: int = 0
+    bottom_pixels: int = 0
+    left_pixels: int = 0
+    right_pixels: int = 0
+    resize: Optional[tuple] = None  # (width, height) box to shrink the result into, keeping aspect ratio
+
+
+@contextmanager
+def _timed(result: ProcessResult, stage: str):
+    """Add the time spent in the with-block to result.timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        result.timings[stage] = result.timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+class BatchStats:
+    """
+    Running totals over the ProcessResults of a batch.
+    
+    Only sums and counters are kept, so it is cheap enough to leave on for
+    every run. Pass an instance as the stats argument of
+    iter_process_images or batch_process_images, or feed results to add().
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.statuses = {}
+        self.methods = {}
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.file_seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pixels = 0
+        self.frames = 0
+        self.encoding = {}  # "FORMAT profile" -> [files, encode seconds, bytes written, pixels]
+    
+    def add(self, result: ProcessResult) -> None:
+        self.statuses[result.status] = self.statuses.get(result.status, 0) + 1
+        if result.status == "skipped":
+            return
+        self.methods[result.method] = self.methods.get(result.method, 0) + 1
+        for stage, seconds in result.timings.items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.file_seconds += result.elapsed
+        self.bytes_read += result.bytes_read
+        self.bytes_written += result.bytes_written
+        pixels = result.width * result.height * result.frames
+        self.pixels += pixels
+        self.frames += result.frames
+        if result.profile is not None and result.ok:
+            key = f"{_format_for_path(result.output_path)} {result.profile}"
+            totals = self.encoding.setdefault(key, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += result.timings.get("encode", 0.0)
+            totals[2] += result.bytes_written
+            totals[3] += pixels
+    
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+    
+    def as_dict(self) -> dict:
+        wall = (self.finished or time.perf_counter()) - self.started
+        processed = sum(self.methods.values())
+        timed = sum(self.stage_seconds.values())
+        return {
+            "files": sum(self.statuses.values()),
+            "statuses": dict(self.statuses),
+            "methods": dict(self.methods),
+            "wall_seconds": wall,
+            "images_per_sec": processed / wall if wall > 0 else 0.0,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "megapixels": self.pixels / 1e6,
+            # Every frame of an animation or page of a multi-page TIFF counts
+            "frames": self.frames,
+            "frames_per_sec": self.frames / wall if wall > 0 else 0.0,
+            "mb_read_per_sec": self.bytes_read / wall / 1e6 if wall > 0 else 0.0,
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_share": {
+                stage: seconds / timed for stage, seconds in self.stage_seconds.items()
+            } if timed else {},
+            "mean_file_ms": self.file_seconds / processed * 1000 if processed else 0.0,
+            # Encode time against output size for each format and profile
+            "encoding": {
+                key: {
+                    "files": files,
+                    "encode_seconds": seconds,
+                    "bytes_written": written,
+                    "megapixels": pixels / 1e6,
+                    "encode_ms_per_megapixel": seconds * 1000 / (pixels / 1e6) if pixels else 0.0,
+                    "bytes_per_pixel": written / pixels if pixels else 0.0,
+                }
+                for key, (files, seconds, written, pixels) in self.encoding.items()
+            },
+        }
+    
+    def write_json(self, path) -> None:
+        Path(path).write_text(json.dumps(self.as_dict(), indent=2), encoding="utf-8")
+    
+    @classmethod
+    def from_dict(cls, summary: dict) -> "BatchStats":
+        """Rebuild the totals behind an as_dict() summary, e.g. a shard's JSON report."""
+        stats = cls()
+        stats.started, stats.finished = 0.0, summary["wall_seconds"]
+        stats.statuses = dict(summary["statuses"])
+        stats.methods = dict(summary["methods"])
+        stats.stage_seconds = {**stats.stage_seconds, **summary["stage_seconds"]}
+        stats.file_seconds = summary["mean_file_ms"] / 1000 * sum(stats.methods.values())
+        stats.bytes_read = summary["bytes_read"]
+        stats.bytes_written = summary["bytes_written"]
+        stats.pixels = round(summary["megapixels"] * 1e6)
+        stats.frames = summary.get("frames", 0)
+        stats.encoding = {
+            key: [entry["files"], entry["encode_seconds"], entry["bytes_written"],
+                  round(entry.get("megapixels", 0.0) * 1e6)]
+            for key, entry in summary.get("encoding", {}).items()
+        }
+        return stats
+    
+    def merge(self, other: "BatchStats") -> None:
+        """
+        Add other's totals to these.
+        
+        The wall time becomes the longer of the two, as for batches that ran
+        side by side (e.g. shards on different machines).
+        """
+        for mine, theirs in ((self.statuses, other.statuses), (self.methods, other.methods),
+                             (self.stage_seconds, other.stage_seconds)):
+            for key, value in theirs.items():
+                mine[key] = mine.get(key, 0) + value
+        self.file_seconds += other.file_seconds
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        self.pixels += other.pixels
+        self.frames += other.frames
+        for key, values in other.encoding.items():
+            totals = self.encoding.setdefault(key, [0, 0.0, 0, 0])
+            for idx, value in enumerate(values):
+                totals[idx] += value
+        wall = max((self.finished or time.perf_counter()) - self.started,
+                   (other.finished or time.perf_counter()) - other.started)
+        self.started, self.finished = 0.0, wall
+
+
+_CSV_FIELDS = ["path", "status", "method", "profile", "output_path", "width", "height", "frames", "bytes_read",
+               "bytes_written", "elapsed", *STAGES, "error"]
+
+
+def _csv_row(result: ProcessResult) -> dict:
+    row = {
+        "path": str(result.path),
+        "status": result.status,
+        "method": result.method,
+        "profile": result.profile or "",
+        "output_path": str(result.output_path or ""),
+        "width": result.width,
+        "height": result.height,
+        "frames": result.frames,
+        "bytes_read": result.bytes_read,
+        "bytes_written": result.bytes_written,
+        "elapsed": f"{result.elapsed:.6f}",
+        "error": str(result.error or ""),
+    }
+    for stage in STAGES:
+        row[stage] = f"{result.timings.get(stage, 0.0):.6f}"
+    return row
+
+
+def _mirror_bands(
+    img: Image.Image,
+    top_pixels: int,
+    bottom_pixels: int,
+    left_pixels: int,
+    right_pixels: int,
+) -> Image.Image:
+    """
+    Mirror each edge band of img to the opposite side, modifying img in place.
+    
+    Only the four source bands are copied; the rest of the frame is left
+    untouched, and the image keeps its mode, palette and bit depth.
+    """
+    width, height = img.size
+    
+    # Validate inputs
+    top_pixels = max(0, min(top_pixels, height // 2))
+    bottom_pixels = max(0, min(bottom_pixels, height // 2))
+    left_pixels = max(0, min(left_pixels, width // 2))
+    right_pixels = max(0, min(right_pixels, width // 2))
+    
+    # Every band is read from the original pixels, so snapshot them all first
+    top_section = img.crop((0, 0, width, top_pixels)) if top_pixels else None
+    bottom_section = img.crop((0, height - bottom_pixels, width, height)) if bottom_pixels else None
+    left_section = img.crop((0, 0, left_pixels, height)) if left_pixels else None
+    right_section = img.crop((width - right_pixels, 0, width, height)) if right_pixels else None
+    
+    # Handle top -> bottom mirroring
+    if top_section is not None:
+        img.paste(top_section, (0, height - top_pixels))
+    
+    # Handle bottom -> top mirroring
+    if bottom_section is not None:
+        img.paste(bottom_section, (0, 0))
+    
+    # Handle left -> right mirroring
+    if left_section is not None:
+        img.paste(left_section, (width - left_pixels, 0))
+    
+    # Handle right -> left mirroring
+    if right_section is not None:
+        img.paste(right_section, (0, 0))
+    
+    return img
+
+
+def _mirror_bands_array(
+    arr,
+    top_pixels: int,
+    bottom_pixels: int,
+    left_pixels: int,
+    right_pixels: int,
+    row_axis: int = 0,
+):
+    """
+    Mirror edge bands of a NumPy array in place using slice assignments.
+    
+    Rows live on ``row_axis`` and columns on the axis after it, so the same
+    code handles (H, W[, C]) images and (N, H, W[, C]) stacks.
+    """
+    height, width = arr.shape[row_axis], arr.shape[row_axis + 1]
+    top_pixels = max(0, min(top_pixels, height // 2))
+    bottom_pixels = max(0, min(bottom_pixels, height // 2))
+    left_pixels = max(0, min(left_pixels, width // 2))
+    right_pixels = max(0, min(right_pixels, width // 2))
+    
+    lead = (slice(None),) * row_axis
+    
+    def rows(start, stop):
+        return lead + (slice(start, stop),)
+    
+    def cols(start, stop):
+        return lead + (slice(None), slice(start, stop))
+    
+    # Every band is read from the original pixels, so snapshot them all first
+    top_band = arr[rows(0, top_pixels)].copy() if top_pixels else None
+    bottom_band = arr[rows(height - bottom_pixels, height)].copy() if bottom_pixels else None
+    left_band = arr[cols(0, left_pixels)].copy() if left_pixels else None
+    right_band = arr[cols(width - right_pixels, width)].copy() if right_pixels else None
+    
+    if top_band is not None:
+        arr[rows(height - top_pixels, height)] = top_band
+    if bottom_band is not None:
+        arr[rows(0, bottom_pixels)] = bottom_band
+    if left_band is not None:
+        arr[cols(width - left_pixels, width)] = left_band
+    if right_band is not None:
+        arr[cols(0, right_pixels)] = right_band
+    
+    return arr
+
+
+def crop_and_mirror_stack(
+    stack,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    copy: bool = True,
+):
+    """
+    Crop and mirror a stack of same-sized images in one vectorized pass.
+    
+    Args:
+        stack: NumPy array shaped (N, H, W) or (N, H, W, C)
+        top_pixels: Pixels to crop from top and mirror to bottom
+        bottom_pixels: Pixels to crop from bottom and mirror to top
+        left_pixels: Pixels to crop from left and mirror to right
+        right_pixels: Pixels to crop from right and mirror to left
+        copy: Work on a copy of stack (default); pass False to modify a
+            writable array in place and skip the full-stack copy
+    
+    Returns:
+        NumPy array with the same shape and dtype as stack
+    """
+    import numpy as np
+    
+    result = np.array(stack) if copy else np.asarray(stack)
+    if result.ndim not in (3, 4):
+        raise ValueError(f"Expected an (N, H, W[, C]) stack, got shape {result.shape}")
+    return _mirror_bands_array(result, top_pixels, bottom_pixels, left_pixels, right_pixels, row_axis=1)
+
+
+def _transform(
+    img: Image.Image,
+    bands: tuple,
+    backend: str,
+    preserve_mode: bool = True,
+    owned: bool = False,
+) -> Image.Image:
+    """
+    Run the crop/mirror on img with the chosen backend.
+    
+    When owned is True img was decoded by us and is modified in place;
+    otherwise the caller's image is copied once first.
+    """
+    if backend not in ("pillow", "numpy"):
+        raise ValueError(f"backend must be 'pillow' or 'numpy', not {backend!r}")
+    
+    if not preserve_mode and img.mode != "RGB":
+        img = _convert(img, "RGB")
+        owned = True
+    
+    # Mode "1" is bit-packed, which NumPy cannot round-trip through tobytes()
+    if backend == "pillow" or img.mode == "1":
+        return _mirror_bands(img if owned else img.copy(), *bands)
+    
+    import numpy as np
+    
+    arr = _mirror_bands_array(np.array(img), *bands)
+    result = img if owned else img.copy()
+    result.frombytes(arr.tobytes())
+    return result
+
+
+def _format_for_path(path) -> str:
+    """Return the Pillow format name implied by path's extension."""
+    suffix = Path(path).suffix.lower()
+    format = Image.registered_extensions().get(suffix)
+    if format is None:
+        raise ValueError(f"unknown file extension: {suffix}")
+    return format
+
+
+def _open_image(source) -> Image.Image:
+    """Open and fully decode a path or encoded bytes into an image we own."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(source))
+        img.load()
+        return img
+    # Closing our own handle leaves the decoded image usable, unlike img.close()
+    with open(source, "rb") as fp:
+        img = Image.open(fp)
+        img.load()
+    return img
+
+
+# Modes accepted by writers that cannot store every mode
+_WRITABLE_MODES = {
+    "JPEG": {"1", "L", "RGB", "CMYK"},
+    "PNG": {"1", "L", "LA", "I", "I;16", "P", "RGB", "RGBA"},
+    "BMP": {"1", "L", "P", "RGB", "RGBA"},
+}
+
+
+def _colour_space(mode: str) -> str:
+    """Return the colour space an ICC profile for an image in mode describes."""
+    if mode in ("1", "L", "LA", "La", "I", "I;16", "F"):
+        return "GRAY"
+    if mode in ("P", "PA", "RGB", "RGBA", "RGBa", "RGBX"):
+        return "RGB"
+    return mode
+
+
+def _convert(img: Image.Image, mode: str) -> Image.Image:
+    """
+    Convert img to mode, dropping an ICC profile that no longer fits.
+    
+    Image.convert() copies info unchanged, so a CMYK or grayscale profile
+    would otherwise be embedded in the RGB result.
+    """
+    converted = img.convert(mode)
+    if _colour_space(img.mode) != _colour_space(mode):
+        converted.info.pop("icc_profile", None)
+    return converted
+
+
+def encoder_params(format: str, profile: str = DEFAULT_PROFILE) -> dict:
+    """Return the save() keyword arguments profile uses for format."""
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"profile must be one of {', '.join(ENCODER_PROFILES)}, not {profile!r}")
+    return dict(ENCODER_PROFILES[profile].get(format.upper(), {}))
+
+
+def _save_image(img: Image.Image, target, format: str = None, profile: str = DEFAULT_PROFILE, **params) -> None:
+    """
+    Save img, converting it first only if the output format cannot hold its mode.
+    
+    target is a path or a binary file object; format defaults to the one
+    implied by the path's extension. The encoder profile's settings and the
+    source's EXIF and ICC data are applied, then overridden by params.
+    """
+    if format is None:
+        format = _format_for_path(target)
+    format = format.upper()
+    allowed = _WRITABLE_MODES.get(format)
+    if allowed is not None and img.mode not in allowed:
+        has_alpha = "A" in img.getbands() or "transparency" in img.info
+        img = _convert(img, "RGBA" if has_alpha and "RGBA" in allowed else "RGB")
+    metadata = {key: img.info[key] for key in _METADATA_KEYS.get(format, ()) if img.info.get(key)}
+    img.save(target, format=format, **{**metadata, **encoder_params(format, profile), **params})
+
+
+def transform_image(
+    source,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    format: str = None,
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    profile: str = DEFAULT_PROFILE,
+):
+    """
+    Crop and mirror an image held in memory, returning the same kind of container.
+    
+    Args:
+        source: A PIL Image, encoded image bytes (bytes/bytearray/memoryview),
+            a binary file-like object, or a NumPy array
+        top_pixels: Pixels to crop from top and mirror to bottom
+        bottom_pixels: Pixels to crop from bottom and mirror to top
+        left_pixels: Pixels to crop from left and mirror to right
+        right_pixels: Pixels to crop from right and mirror to left
+        format: Output format for bytes/file-like sources (default: the
+            source's own format, or PNG if it has none)
+        backend: "pillow" for crop/paste, or "numpy" for slice assignments
+            on a single buffer (identical pixels; NumPy arrays stay arrays)
+        preserve_mode: Keep the source mode (RGBA, L, P, I;16, CMYK...);
+            pass False to convert to RGB first
+        profile: Encoder profile for bytes/file-like sources, one of
+            ENCODER_PROFILES ("fast", "balanced" or "smallest")
+    
+    Returns:
+        A PIL Image for Image sources, bytes for bytes sources, a BytesIO
+        positioned at the start for file-like sources, or a NumPy array for
+        array sources
+    """
+    bands = (top_pixels, bottom_pixels, left_pixels, right_pixels)
+    
+    if isinstance(source, Image.Image):
+        return _transform(source, bands, backend, preserve_mode)
+    
+    if hasattr(source, "__array_interface__"):
+        import numpy as np
+        
+        if backend == "numpy" and preserve_mode:
+            return _mirror_bands_array(np.array(source), *bands)
+        return np.asarray(_transform(Image.fromarray(source), bands, backend, preserve_mode))
+    
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(source)
+    elif hasattr(source, "read"):
+        stream = source
+    else:
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+    
+    img = Image.open(stream)
+    result = _transform(img, bands, backend, preserve_mode, owned=True)
+    output = io.BytesIO()
+    _save_image(result, output, format=format or img.format or "PNG", profile=profile)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return output.getvalue()
+    output.seek(0)
+    return output
 
 
 def crop_and_mirror(
@@ -12,6 +573,8 @@ def crop_and_mirror(
     bottom_pixels: int = 0,
     left_pixels: int = 0,
     right_pixels: int = 0,
+    backend: str = "pillow",
+    preserve_mode: bool = True,
 ) -> Image.Image:
     """
     Crop specified pixels from sides and mirror them to opposite sides.
@@ -22,46 +585,1052 @@ def crop_and_mirror(
         bottom_pixels: Pixels to crop from bottom and mirror to top
         left_pixels: Pixels to crop from left and mirror to right
         right_pixels: Pixels to crop from right and mirror to left
+        backend: "pillow" (default) or "numpy"
+        preserve_mode: Keep the source mode; pass False to convert to RGB
     
     Returns:
-        Modified PIL Image object
+        Modified PIL Image object. For animations and multi-page files this
+        is the first frame; batch, archive and server processing transform
+        every frame.
     """
-    img = Image.open(image_path).convert("RGB")
-    width, height = img.size
+    bands = (top_pixels, bottom_pixels, left_pixels, right_pixels)
+    return _transform(_open_image(image_path), bands, backend, preserve_mode, owned=True)
+
+
+def _file_sha256(path: Path) -> str:
+    """Return the hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProcessManifest:
+    """
+    Record of processed inputs, kept as JSON lines in the output folder.
     
-    # Validate inputs
-    top_pixels = max(0, min(top_pixels, height // 2))
-    bottom_pixels = max(0, min(bottom_pixels, height // 2))
-    left_pixels = max(0, min(left_pixels, width // 2))
-    right_pixels = max(0, min(right_pixels, width // 2))
+    Each line maps an input path (relative to the input folder) to the size,
+    mtime and optional SHA-256 it had when it was processed, together with
+    the options used. Later lines supersede earlier ones, so recording a
+    file is a single append.
     
-    # Crop from each side and mirror to opposite
-    result = img.copy()
+    With shard=(index, count), entries are appended to a journal of that
+    shard's own, while the merged manifest is still read for skip checks.
+    """
     
-    # Handle top -> bottom mirroring
-    if top_pixels > 0:
-        top_section = img.crop((0, 0, width, top_pixels))
-        result.paste(top_section, (0, height - top_pixels))
+    def __init__(self, input_folder, output_folder, hash_contents: bool = False, shard: tuple = None):
+        self.input_path = Path(input_folder)
+        self.path = Path(output_folder) / MANIFEST_NAME
+        self.hash_contents = hash_contents
+        self.entries = {}
+        self._line_count = 0
+        self._fp = None
+        # record() runs on a pipeline's feeder thread (hash checks) and its consumer
+        self._lock = threading.Lock()
+        self._merged_path = None
+        if shard is not None:
+            # Shards journal to files of their own so machines never append to
+            # the same one; merge_shards folds them back into MANIFEST_NAME
+            self._merged_path = self.path
+            self.path = self.path.with_name(shard_file_name(MANIFEST_NAME, *shard))
+            self._load(self._merged_path)
+            self._line_count = 0
+        self._load(self.path)
     
-    # Handle bottom -> top mirroring
-    if bottom_pixels > 0:
-        bottom_section = img.crop((0, height - bottom_pixels, width, height))
-        result.paste(bottom_section, (0, 0))
+    def __enter__(self):
+        return self
     
-    # Handle left -> right mirroring
-    if left_pixels > 0:
-        left_section = img.crop((0, 0, left_pixels, height))
-        result.paste(left_section, (width - left_pixels, 0))
+    def __exit__(self, *exc_info):
+        self.close()
     
-    # Handle right -> left mirroring
-    if right_pixels > 0:
-        right_section = img.crop((width - right_pixels, 0, width, height))
-        result.paste(right_section, (0, 0))
+    def _load(self, path: Path):
+        try:
+            with open(path, encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from an interrupted run
+                    self.entries[entry["input"]] = entry
+                    self._line_count += 1
+        except FileNotFoundError:
+            pass
+    
+    def _key(self, image_file: Path) -> str:
+        try:
+            return image_file.relative_to(self.input_path).as_posix()
+        except ValueError:
+            return image_file.as_posix()
+    
+    @staticmethod
+    def _comparable(options: dict) -> dict:
+        # Backends produce identical pixels, so switching them is not a change
+        return {key: value for key, value in options.items() if key != "backend"}
+    
+    @staticmethod
+    def signature(image_file: Path) -> dict:
+        """Return the size/mtime signature record() stores for image_file."""
+        stat = image_file.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    
+    def check(self, image_file: Path, output_file: Path, options: dict) -> tuple:
+        """
+        Compare image_file against its last recorded run.
+        
+        Returns:
+            Tuple of (is_current, signature); pass signature to record()
+            once the file has been processed
+        """
+        signature = self.signature(image_file)
+        entry = self.entries.get(self._key(image_file))
+        if (
+            entry is None
+            or entry["size"] != signature["size"]
+            or entry["options"] != self._comparable(options)
+            or not output_file.exists()
+        ):
+            return False, signature
+        if entry["mtime_ns"] == signature["mtime_ns"]:
+            return True, signature
+        if not self.hash_contents:
+            return False, signature
+        
+        # Touched but possibly unchanged: fall back to the content hash
+        signature["sha256"] = _file_sha256(image_file)
+        if entry.get("sha256") != signature["sha256"]:
+            return False, signature
+        self.record(image_file, output_file, options, signature)
+        return True, signature
+    
+    def record(self, image_file: Path, output_file: Path, options: dict, signature: dict) -> None:
+        """Append an entry for a successfully processed file."""
+        entry = {"input": self._key(image_file), **signature}
+        if self.hash_contents and "sha256" not in entry:
+            entry["sha256"] = _file_sha256(image_file)
+        entry["options"] = self._comparable(options)
+        entry["output"] = str(output_file)
+        
+        with self._lock:
+            if self._fp is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fp = open(self.path, "a", encoding="utf-8")
+            self._fp.write(json.dumps(entry) + "\n")
+            self._fp.flush()
+            self.entries[entry["input"]] = entry
+            self._line_count += 1
+    
+    def close(self) -> None:
+        """Close the manifest, compacting it if superseded lines dominate."""
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+            # A shard's journal is short-lived; merge_shards compacts it into the main manifest
+            if self._merged_path is None and self._line_count > 2 * len(self.entries) + 1000:
+                temp_path = self.path.with_suffix(".tmp")
+                with open(temp_path, "w", encoding="utf-8") as fp:
+                    for entry in self.entries.values():
+                        fp.write(json.dumps(entry) + "\n")
+                os.replace(temp_path, self.path)
+                self._line_count = len(self.entries)
+
+
+def _jpeg_band_moves(size: tuple, mcu_size: tuple, bands: tuple) -> Optional[list]:
+    """
+    Plan the band moves for a lossless JPEG transform.
+    
+    Returns a list of ((width, height, x, y) crop, (x, y) drop position)
+    pairs in the same order the pixel path pastes them, or None if any crop
+    or drop offset falls off the iMCU grid. jpegtran -drop writes whole
+    iMCUs, so each band's size must also be a multiple of the iMCU, except
+    where the dropped band ends at the image's right or bottom edge.
+    """
+    width, height = size
+    mcu_width, mcu_height = mcu_size
+    moves = []
+    for (x0, y0, x1, y1), (drop_x, drop_y) in band_moves(size, *bands):
+        if x0 % mcu_width or drop_x % mcu_width or y0 % mcu_height or drop_y % mcu_height:
+            return None
+        band_width, band_height = x1 - x0, y1 - y0
+        if band_width % mcu_width and drop_x + band_width != width:
+            return None
+        if band_height % mcu_height and drop_y + band_height != height:
+            return None
+        moves.append(((band_width, band_height, x0, y0), (drop_x, drop_y)))
+    return moves
+
+
+def _mirror_jpeg_lossless(image_file: Path, output_file: Path, bands: tuple) -> bool:
+    """
+    Move the edge bands of a JPEG by rearranging DCT blocks with jpegtran.
+    
+    Each band is cut out with ``jpegtran -crop`` and dropped into place with
+    ``jpegtran -drop`` (libjpeg-turbo 2.1+ or IJG libjpeg 9), so the image is
+    never fully decoded or re-encoded and no generation loss occurs.
+    
+    Returns:
+        True if output_file was written, False if the file is not a JPEG,
+        the bands are not iMCU-aligned or jpegtran is unavailable; the
+        caller should then fall back to the pixel path
+    """
+    jpegtran = shutil.which("jpegtran")
+    if jpegtran is None:
+        return False
+    
+    with Image.open(image_file) as img:
+        if img.format != "JPEG":
+            return False
+        # img.layer holds (component id, h sampling, v sampling, qtable)
+        mcu_size = (
+            8 * max(layer[1] for layer in img.layer),
+            8 * max(layer[2] for layer in img.layer),
+        )
+        moves = _jpeg_band_moves(img.size, mcu_size, bands)
+    if not moves:
+        return False
+    
+    with tempfile.TemporaryDirectory(prefix="image_cropper_") as temp_dir:
+        temp_path = Path(temp_dir)
+        try:
+            # Cut every band from the untouched source before dropping any
+            band_files = []
+            for idx, ((width, height, x, y), _) in enumerate(moves):
+                band_file = temp_path / f"band{idx}.jpg"
+                subprocess.run(
+                    [jpegtran, "-copy", "none", "-crop", f"{width}x{height}+{x}+{y}",
+                     "-outfile", str(band_file), str(image_file)],
+                    check=True, capture_output=True,
+                )
+                band_files.append(band_file)
+            
+            current = image_file
+            for idx, (band_file, (_, (drop_x, drop_y))) in enumerate(zip(band_files, moves)):
+                next_file = temp_path / f"step{idx}.jpg"
+                subprocess.run(
+                    [jpegtran, "-copy", "all", "-drop", f"+{drop_x}+{drop_y}", str(band_file),
+                     "-outfile", str(next_file), str(current)],
+                    check=True, capture_output=True,
+                )
+                current = next_file
+        except (OSError, subprocess.CalledProcessError):
+            return False  # e.g. a jpegtran build without -drop support
+        shutil.copyfile(current, output_file)
+    return True
+
+
+def _try_file_fast_path(image_file: Path, output_file: Path, options: dict) -> Optional[str]:
+    """
+    Try the transforms that work on the file without decoding it.
+    
+    Returns:
+        The method name if output_file was written, otherwise None
+    """
+    bands = tuple(options[key] for key in _BAND_OPTIONS)
+    if options.get("lossless_jpeg") and _mirror_jpeg_lossless(image_file, output_file, bands):
+        return "jpeg-lossless"
+    # Streaming copies raw bytes, so it can only honour preserve_mode=True
+    if options.get("large_images") and options["preserve_mode"]:
+        if stream_crop_and_mirror(image_file, output_file, *bands):
+            return "band-stream"
+    return None
+
+
+def _partial_path(output_file: Path) -> Path:
+    """Hidden temporary name next to output_file, unique per process and thread."""
+    return output_file.with_name(f".{output_file.name}.{os.getpid()}-{threading.get_ident()}.partial")
+
+
+def _write_atomic(output_file: Path, data) -> None:
+    """Write data to output_file via a temporary file, so it never exists half-written."""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _partial_path(output_file)
+    try:
+        temp_file.write_bytes(data)
+        os.replace(temp_file, output_file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+
+def _decode_step(result: ProcessResult, source) -> Image.Image:
+    with _timed(result, "decode"):
+        img = _open_image(source)
+    result.width, result.height = img.size
+    return img
+
+
+def _transform_step(result: ProcessResult, img: Image.Image, options: dict) -> Image.Image:
+    bands = tuple(options[key] for key in _BAND_OPTIONS)
+    with _timed(result, "transform"):
+        return _transform(img, bands, options["backend"], options["preserve_mode"], owned=True)
+
+
+def _fit_within(img: Image.Image, size: tuple) -> Image.Image:
+    """Shrink img in place to fit within size, keeping its aspect ratio; never enlarges."""
+    img.thumbnail(tuple(size), Image.LANCZOS, reducing_gap=3.0)
+    return img
+
+
+def _transform_outputs(result: ProcessResult, img: Image.Image, output_file: Path, options: dict):
+    """
+    Yield (output file, image) pairs to encode for one decoded input.
+    
+    Without variants that is the batch's crop/mirror for output_file. With
+    variants, each one is rendered from the same decoded img (a copy for all
+    but the last, which may reuse it) and resized if it asks for it.
+    """
+    variants = options.get("variants")
+    if not variants:
+        yield output_file, _transform_step(result, img, options)
+        return
+    for idx, (variant, target) in enumerate(zip(variants, options["variant_outputs"])):
+        with _timed(result, "transform"):
+            processed = _transform(
+                img, tuple(variant["bands"]), options["backend"], options["preserve_mode"],
+                owned=idx == len(variants) - 1,
+            )
+            if variant["resize"]:
+                processed = _fit_within(processed, variant["resize"])
+        yield target, processed
+
+
+def _encode_step(result: ProcessResult, img: Image.Image, output_file, options: dict) -> io.BytesIO:
+    """Encode img in the format output_file's extension implies."""
+    result.profile = options.get("profile", DEFAULT_PROFILE)
+    with _timed(result, "encode"):
+        buffer = io.BytesIO()
+        _save_image(img, buffer, format=_format_for_path(output_file), profile=result.profile)
+    result.bytes_written += buffer.tell()
+    return buffer
+
+
+def _encode_to_file(result: ProcessResult, img: Image.Image, output_file: Path, format: str, **params) -> None:
+    """
+    Encode img straight into a temporary file next to output_file, then rename it into place.
+    
+    Nothing is buffered in memory, so only the decoded image is held while
+    it is encoded. save() counts as encode time, closing and renaming as write.
+    """
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _partial_path(output_file)
+    try:
+        fp = open(temp_file, "wb")
+        try:
+            with _timed(result, "encode"):
+                _save_image(img, fp, format=format, profile=result.profile, **params)
+        finally:
+            with _timed(result, "write"):
+                fp.close()
+        result.bytes_written += temp_file.stat().st_size
+        with _timed(result, "write"):
+            os.replace(temp_file, output_file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+
+def _encode_and_write_step(result: ProcessResult, img: Image.Image, output_file: Path, options: dict) -> None:
+    result.profile = options.get("profile", DEFAULT_PROFILE)
+    _encode_to_file(result, img, output_file, _format_for_path(output_file))
+
+
+def _match_palette(frame: Image.Image, palette_image: Image.Image) -> Image.Image:
+    """
+    Map an RGB frame back onto palette_image's palette if it uses only those colours.
+    
+    Pillow composites later GIF frames to RGB; remapping them keeps the
+    source's global palette instead of letting the writer quantize each
+    frame to a palette of its own.
+    """
+    colors = frame.getcolors(256)
+    if frame.mode != "RGB" or palette_image.mode != "P" or colors is None:
+        return frame
+    palette = palette_image.getpalette("RGB")
+    available = {tuple(palette[idx:idx + 3]) for idx in range(0, len(palette), 3)}
+    if any(color not in available for _, color in colors):
+        return frame
+    remapped = frame.quantize(palette=palette_image, dither=Image.Dither.NONE)
+    remapped.info = frame.info
+    return remapped
+
+
+def _iter_frames(result: ProcessResult, img: Image.Image, options: dict, format: str):
+    """
+    Decode, crop and mirror the frames of img one at a time.
+    
+    Each frame is yielded before the next is decoded, so a consumer that
+    writes frames as they arrive holds a single frame in memory. format is
+    the output format; GIF-to-GIF frames are mapped back onto the first
+    frame's palette where they can be.
+    """
+    bands = tuple(options[key] for key in _BAND_OPTIONS)
+    first = None
+    for index in range(img.n_frames):
+        with _timed(result, "decode"):
+            img.seek(index)
+            frame = img.copy()
+            if img.format == "GIF":
+                frame.info["disposal"] = img.disposal_method
+        with _timed(result, "transform"):
+            frame = _transform(frame, bands, options["backend"], options["preserve_mode"], owned=True)
+            if img.format == "GIF" and format == "GIF":
+                # Only GIF output needs the first frame; other formats release each frame once written
+                if first is None:
+                    first = frame
+                else:
+                    frame = _match_palette(frame, first)
+        result.frames = index + 1
+        yield frame
+
+
+def _animation_params(frames: list, format: str) -> dict:
+    """Return the save() arguments that write frames as one animation."""
+    params = {"save_all": True, "append_images": frames[1:]}
+    params["duration"] = [frame.info.get("duration", 0) for frame in frames]
+    if format == "GIF":
+        params["disposal"] = [frame.info.get("disposal", 0) for frame in frames]
+    return params
+
+
+def _common_mode(frames: list) -> list:
+    """
+    Convert frames to one mode if they differ, as animation writers other than GIF expect.
+    
+    Pillow composites later GIF frames to RGB while the first stays P, so
+    every frame becomes RGBA if any has transparency, otherwise RGB.
+    """
+    if len({frame.mode for frame in frames}) == 1:
+        return frames
+    has_alpha = any("A" in frame.getbands() or "transparency" in frame.info for frame in frames)
+    return [_convert(frame, "RGBA" if has_alpha else "RGB") for frame in frames]
+
+
+def _write_frames(result: ProcessResult, frames, fp, format: str) -> None:
+    """
+    Encode frames into the binary file object fp as one multi-frame image.
+    
+    TIFF pages are appended one at a time, so only the current page is
+    held; fp must then be readable and seekable as well. Animations keep
+    each frame's duration and disposal.
+    """
+    if format == "TIFF":
+        with TiffImagePlugin.AppendingTiffWriter(fp) as tiff:
+            for frame in frames:
+                with _timed(result, "encode"):
+                    _save_image(frame, tiff, format="TIFF", profile=result.profile)
+                    tiff.newFrame()
+        return
+    # Animation writers diff every frame against the previous ones, so Pillow
+    # collects them all before writing; hold them once here rather than twice
+    frames = list(frames)
+    with _timed(result, "encode"):
+        if format != "GIF":
+            frames = _common_mode(frames)
+        _save_image(frames[0], fp, format=format, profile=result.profile, **_animation_params(frames, format))
+
+
+def _multi_frame_step(result: ProcessResult, source, output, options: dict, format: str = None) -> bool:
+    """
+    Crop/mirror every frame of an animated GIF/PNG/WebP or multi-page TIFF.
     
+    output is a path, written through a temporary file and renamed into
+    place, or a binary file object such as the BytesIO archives and the
+    server encode into; format defaults to the one implied by the path's
+    extension.
+    
+    Returns False without writing anything when source has a single frame,
+    when variants are requested, or when the output format holds only one
+    frame; the caller then processes the first frame as a still image.
+    """
+    if options.get("variants"):
+        return False
+    if format is None:
+        format = _format_for_path(output)
+    format = format.upper()
+    if format not in _MULTI_FRAME_FORMATS:
+        return False
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        fp = io.BytesIO(source)
+    else:
+        fp = open(source, "rb")
+    with fp:
+        with _timed(result, "decode"):
+            img = Image.open(fp)
+            # is_animated stops at the second frame instead of counting them all
+            if img.format not in _MULTI_FRAME_FORMATS or not getattr(img, "is_animated", False):
+                return False
+        result.width, result.height = img.size
+        result.profile = options.get("profile", DEFAULT_PROFILE)
+        frames = _iter_frames(result, img, options, format)
+        if not isinstance(output, (str, os.PathLike)):
+            start = output.tell()
+            _write_frames(result, frames, output, format)
+            result.bytes_written += output.seek(0, io.SEEK_END) - start
+            return True
+        output_file = Path(output)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = _partial_path(output_file)
+        try:
+            with open(temp_file, "w+b") as out:
+                _write_frames(result, frames, out, format)
+            result.bytes_written += temp_file.stat().st_size
+            with _timed(result, "write"):
+                os.replace(temp_file, output_file)
+        except BaseException:
+            temp_file.unlink(missing_ok=True)
+            raise
+    return True
+
+
+def _fast_path_step(result: ProcessResult, image_file: Path, output_file: Path, options: dict) -> bool:
+    """Run _try_file_fast_path, filling in result if one of them handled the file."""
+    if options.get("variants"):
+        return False  # Fast paths write a single output
+    # Both fast paths rewrite the input file, so the format cannot change
+    if options.get("output_suffix") and _format_for_path(image_file) != _format_for_path(output_file):
+        return False
+    start = time.perf_counter()
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _partial_path(output_file)
+    method = None
+    try:
+        method = _try_file_fast_path(image_file, temp_file, options)
+        if method is not None:
+            os.replace(temp_file, output_file)
+    finally:
+        if method is None:
+            temp_file.unlink(missing_ok=True)
+    if method is None:
+        return False
+    result.method = method
+    result.timings["transform"] = time.perf_counter() - start
+    result.bytes_read = image_file.stat().st_size
+    result.bytes_written = output_file.stat().st_size
+    return True
+
+
+def _process_file(image_file: Path, output_file: Path, options: dict) -> ProcessResult:
+    """
+    Crop/mirror a single file and save it; runs inside pool workers.
+    
+    options holds the crop_and_mirror keyword arguments for the batch plus
+    any batch-only flags such as lossless_jpeg.
+    """
+    result = ProcessResult(image_file, "ok", output_path=output_file)
+    start = time.perf_counter()
+    try:
+        if not _fast_path_step(result, image_file, output_file, options):
+            result.bytes_read = image_file.stat().st_size
+            if not _multi_frame_step(result, image_file, output_file, options):
+                img = _decode_step(result, image_file)
+                # Encode each output as soon as it is rendered to keep only one copy alive
+                for target, processed in _transform_outputs(result, img, output_file, options):
+                    _encode_and_write_step(result, processed, target, options)
+    except Exception as e:
+        result.status = "failed"
+        result.output_path = None
+        result.error = e
+    result.elapsed = time.perf_counter() - start
     return result
 
 
-def batch_process_images(
+def _run_parallel(jobs, workers: int, executor: str) -> Iterator[ProcessResult]:
+    """
+    Run _process_file jobs in a pool, yielding results as each finishes.
+    
+    At most ``workers * 2`` jobs are in flight at once so large folders do not
+    queue every file up front.
+    """
+    if executor == "process":
+        pool_class = ProcessPoolExecutor
+    elif executor == "thread":
+        pool_class = ThreadPoolExecutor
+    else:
+        raise ValueError(f"executor must be 'process', 'thread' or 'pipeline', not {executor!r}")
+    
+    pending = {}
+    job_iter = iter(jobs)
+    with pool_class(max_workers=workers) as pool:
+        while True:
+            for job in job_iter:
+                if isinstance(job, ProcessResult):
+                    yield job  # Resolved without processing (e.g. skipped)
+                    continue
+                pending[pool.submit(_process_file, *job)] = job
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    yield future.result()
+                else:
+                    # The worker itself died (e.g. a broken process pool)
+                    yield ProcessResult(job[0], "failed", error=error)
+
+
+class PipelineStage:
+    """Counters for one stage of an ImagePipeline."""
+    
+    def __init__(self, name: str, workers: int, input_queue: queue.Queue):
+        self.name = name
+        self.workers = workers
+        self.input_queue = input_queue
+        self.processed = 0
+        self.busy_time = 0.0
+        self.started = None
+        self._lock = threading.Lock()
+    
+    @property
+    def queue_depth(self) -> int:
+        """Items waiting for this stage."""
+        return self.input_queue.qsize()
+    
+    @property
+    def throughput(self) -> float:
+        """Items completed per second of wall time since the pipeline started."""
+        if self.started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+    
+    def _add(self, busy: float) -> None:
+        with self._lock:
+            self.processed += 1
+            self.busy_time += busy
+    
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "processed": self.processed,
+            "busy_time": self.busy_time,
+            "throughput": self.throughput,
+        }
+
+
+_STOP = object()  # Queue sentinel marking the end of a pipeline stage's input
+
+
+class ImagePipeline:
+    """
+    Read, transform and write stages connected by bounded queues.
+    
+    Reader threads prefetch file bytes, transform threads decode and
+    crop/mirror, and writer threads encode and save, so slow storage and
+    CPU-heavy encoding overlap instead of alternating. Pass an instance as
+    the executor of iter_process_images or batch_process_images and poll
+    stages (or stats()) to watch queue depths and throughput.
+    """
+    
+    def __init__(
+        self,
+        read_threads: int = 2,
+        transform_threads: int = None,
+        write_threads: int = 2,
+        queue_size: int = 8,
+    ):
+        self.read_threads = read_threads
+        self.transform_threads = transform_threads or os.cpu_count() or 1
+        self.write_threads = write_threads
+        self.queue_size = queue_size
+        self.stages = []
+        self._closed = threading.Event()
+    
+    def stats(self) -> list:
+        """Return a list of per-stage counter dicts."""
+        return [stage.as_dict() for stage in self.stages]
+    
+    def _put(self, target: queue.Queue, item) -> bool:
+        # Time out periodically so threads exit if the consumer went away
+        while not self._closed.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _get(self, source: queue.Queue):
+        while not self._closed.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+    
+    # Each stage takes (job, payload, result) and returns the payload for the
+    # next stage, or the result itself once the file is finished
+    
+    @staticmethod
+    def _read(job, _, result):
+        image_file, output_file, options = job
+        if options.get("lossless_jpeg") or options.get("large_images"):
+            return None  # The file-level fast paths read the file themselves
+        with _timed(result, "read"):
+            data = image_file.read_bytes()
+        result.bytes_read = len(data)
+        return data
+    
+    @staticmethod
+    def _decode_and_transform(job, data, result):
+        image_file, output_file, options = job
+        if data is None:
+            if _fast_path_step(result, image_file, output_file, options):
+                return result
+            with _timed(result, "read"):
+                data = image_file.read_bytes()
+            result.bytes_read = len(data)
+        # Animations and multi-page files are written frame by frame right here
+        if _multi_frame_step(result, data, output_file, options):
+            return result
+        img = _decode_step(result, data)
+        return list(_transform_outputs(result, img, output_file, options))
+    
+    @staticmethod
+    def _write(job, outputs, result):
+        for target, processed in outputs:
+            _encode_and_write_step(result, processed, target, job[2])
+        return result
+    
+    def _run_stage(self, stage, func, input_queue, output_queue, remaining, lock, next_workers):
+        # Items are (job, payload, result) until a stage finishes the result
+        while True:
+            item = self._get(input_queue)
+            if item is _STOP:
+                break
+            if not isinstance(item, ProcessResult):
+                job, payload, result = item
+                start = time.perf_counter()
+                try:
+                    output = func(job, payload, result)
+                except Exception as e:
+                    result.status = "failed"
+                    result.output_path = None
+                    result.error = e
+                    output = result
+                busy = time.perf_counter() - start
+                stage._add(busy)
+                result.elapsed += busy
+                item = result if output is result else (job, output, result)
+            if not self._put(output_queue, item):
+                return
+        # The last thread out tells every thread of the next stage to stop
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(next_workers):
+                self._put(output_queue, _STOP)
+    
+    def run(self, jobs) -> Iterator[ProcessResult]:
+        """
+        Process (image_file, output_file, options) jobs through the stages.
+        
+        ProcessResult items in jobs are passed straight through. Results
+        are yielded in completion order.
+        """
+        self._closed.clear()
+        read_queue = queue.Queue(self.queue_size)
+        transform_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+        result_queue = queue.Queue(self.queue_size)
+        self.stages = [
+            PipelineStage("read", self.read_threads, read_queue),
+            PipelineStage("transform", self.transform_threads, transform_queue),
+            PipelineStage("write", self.write_threads, write_queue),
+        ]
+        wiring = [
+            (self._read, read_queue, transform_queue, self.transform_threads),
+            (self._decode_and_transform, transform_queue, write_queue, self.write_threads),
+            (self._write, write_queue, result_queue, 1),
+        ]
+        
+        start = time.perf_counter()
+        threads = []
+        for stage, (func, input_queue, output_queue, next_workers) in zip(self.stages, wiring):
+            stage.started = start
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, func, input_queue, output_queue, remaining, lock, next_workers),
+                    daemon=True,
+                ))
+        
+        def feed():
+            for job in jobs:
+                if isinstance(job, ProcessResult):
+                    item = job
+                else:
+                    item = (job, None, ProcessResult(job[0], "ok", output_path=job[1]))
+                if not self._put(read_queue, item):
+                    return
+            for _ in range(self.read_threads):
+                self._put(read_queue, _STOP)
+        
+        threads.append(threading.Thread(target=feed, daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        try:
+            while True:
+                result = result_queue.get()
+                if result is _STOP:
+                    break
+                yield result
+        finally:
+            self._closed.set()
+            for thread in threads:
+                thread.join()
+
+
+def shard_of(relative_path, shard_count: int) -> int:
+    """
+    Return the shard (0 to shard_count - 1) that a file belongs to.
+    
+    Only the file's path relative to the input folder is hashed, so every
+    machine computes the same split without coordinating, and adding files
+    never moves existing ones to another shard.
+    """
+    key = Path(relative_path).as_posix().encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big") % shard_count
+
+
+def shard_file_name(name: str, shard_index: int, shard_count: int) -> str:
+    """Insert a shard tag before name's extension, e.g. report.shard-0-of-4.json."""
+    stem, _, extension = name.rpartition(".")
+    return f"{stem}.shard-{shard_index}-of-{shard_count}.{extension}"
+
+
+def discover_images(
+    input_folder: str,
+    extensions: list = None,
+    recursive: bool = False,
+    exclude: str = None,
+) -> Iterator[Path]:
+    """
+    Lazily find image files with a single os.scandir walk.
+    
+    Extensions match case-insensitively. Files are yielded in directory
+    order as they are found, so processing can start before a large tree
+    has been fully listed.
+    
+    Args:
+        input_folder: Folder to search
+        extensions: File extensions to match (default: common image formats)
+        recursive: Also search subdirectories (symlinked directories are not
+            followed)
+        exclude: Directory to leave out of the walk, e.g. an output folder
+            nested inside input_folder
+    
+    Yields:
+        Path of each matching file
+    """
+    suffixes = {ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS)}
+    excluded = Path(exclude).resolve() if exclude is not None else None
+    
+    pending_dirs = [str(input_folder)]
+    while pending_dirs:
+        with os.scandir(pending_dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    if os.path.splitext(entry.name)[1].lower() in suffixes:
+                        yield Path(entry.path)
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    if excluded is None or Path(entry.path).resolve() != excluded:
+                        pending_dirs.append(entry.path)
+
+
+class _DiscoveryCounter:
+    """Iterate over discovered files, tracking whether the total is known yet."""
+    
+    def __init__(self, files):
+        self._files = files
+        self.found = 0
+        self.finished = False
+    
+    @property
+    def total(self) -> Optional[int]:
+        return self.found if self.finished else None
+    
+    def __iter__(self):
+        # Look one file ahead so the total is known before the last file runs
+        iterator = iter(self._files)
+        current = next(iterator, None)
+        while current is not None:
+            self.found += 1
+            upcoming = next(iterator, None)
+            if upcoming is None:
+                self.finished = True
+            yield current
+            current = upcoming
+        self.finished = True
+
+
+def _plan_jobs(
+    image_files,
+    input_path: Path,
+    output_path: Path,
+    options: dict,
+    manifest: ProcessManifest = None,
+    skip_current: bool = True,
+    signatures: dict = None,
+    cancel_event: threading.Event = None,
+):
+    """
+    Yield a (image_file, output_file, options) job per file to process.
+    
+    Files the manifest shows as already done are yielded as "skipped"
+    ProcessResults instead, as are files that cannot be checked ("failed").
+    The manifest signature of each yielded job is stored in signatures so
+    the caller can record the file once it succeeds.
+    """
+    for image_file in image_files:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        # Mirror the input's directory structure in the output folder
+        relative = image_file.relative_to(input_path)
+        if options.get("output_suffix"):
+            relative = relative.with_suffix(options["output_suffix"])
+        output_file = output_path / relative
+        job_options = options
+        targets = ()
+        if options.get("variants"):
+            # One subfolder per variant; the first doubles as the result's output_path
+            targets = [output_path / variant["name"] / relative for variant in options["variants"]]
+            output_file = targets[0]
+            job_options = {**options, "variant_outputs": targets}
+        if manifest is not None:
+            try:
+                if skip_current:
+                    is_current, signatures[image_file] = manifest.check(image_file, output_file, options)
+                else:
+                    is_current, signatures[image_file] = False, manifest.signature(image_file)
+            except OSError as e:
+                yield ProcessResult(image_file, "failed", error=e)
+                continue
+            if is_current and all(target.exists() for target in targets):
+                del signatures[image_file]
+                yield ProcessResult(image_file, "skipped", output_path=output_file)
+                continue
+        yield image_file, output_file, job_options
+
+
+def _iter_results(
+    image_files,
+    input_path: Path,
+    output_path: Path,
+    options: dict,
+    workers: int,
+    executor: str,
+    manifest: ProcessManifest = None,
+    skip_current: bool = True,
+    cancel_event: threading.Event = None,
+) -> Iterator[ProcessResult]:
+    """
+    Process image_files, yielding a ProcessResult for each as it completes.
+    
+    Every successful file is recorded in manifest (if given); with
+    skip_current, files the manifest shows as already done are skipped.
+    Once cancel_event is set no further files are started, and the files
+    already in flight finish normally.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    signatures = {}  # Manifest signatures of files currently in flight
+    
+    def jobs():
+        return _plan_jobs(
+            image_files, input_path, output_path, options, manifest, skip_current, signatures, cancel_event,
+        )
+    
+    if isinstance(executor, ImagePipeline):
+        results = executor.run(jobs())
+    elif executor == "pipeline":
+        results = ImagePipeline(transform_threads=workers).run(jobs())
+    elif workers > 1:
+        results = _run_parallel(jobs(), workers, executor)
+    else:
+        results = (job if isinstance(job, ProcessResult) else _process_file(*job) for job in jobs())
+    
+    for result in results:
+        signature = signatures.pop(result.path, None)
+        if result.ok and signature is not None:
+            manifest.record(result.path, result.output_path, options, signature)
+        yield result
+
+
+def _batch_options(
+    top_pixels: int,
+    bottom_pixels: int,
+    left_pixels: int,
+    right_pixels: int,
+    backend: str,
+    preserve_mode: bool,
+    lossless_jpeg: bool,
+    large_images: bool,
+    output_format: str,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+) -> dict:
+    """Build the options dict passed to _process_file and stored in the manifest."""
+    options = dict(
+        top_pixels=top_pixels,
+        bottom_pixels=bottom_pixels,
+        left_pixels=left_pixels,
+        right_pixels=right_pixels,
+        backend=backend,
+        preserve_mode=preserve_mode,
+        lossless_jpeg=lossless_jpeg,
+        large_images=large_images,
+    )
+    if output_format:
+        suffix = "." + output_format.lower().lstrip(".")
+        if suffix not in Image.registered_extensions():
+            raise ValueError(f"unknown output format: {output_format}")
+        # Only added when set, so manifests from earlier runs still match
+        options["output_suffix"] = suffix
+    if profile != DEFAULT_PROFILE:
+        encoder_params("PNG", profile)  # Reject unknown profiles before any work
+        options["profile"] = profile
+    if variants:
+        options["variants"] = _variant_options(variants)
+    return options
+
+
+def _variant_options(variants: list) -> list:
+    """Validate variants (Variant instances or dicts) into JSON-friendly dicts."""
+    normalized = []
+    for variant in variants:
+        if isinstance(variant, dict):
+            variant = Variant(**variant)
+        name = str(variant.name)
+        if not name or name in (".", "..") or "/" in name or "\\" in name:
+            raise ValueError(f"variant name must be a plain folder name, not {variant.name!r}")
+        if any(name == other["name"] for other in normalized):
+            raise ValueError(f"duplicate variant name: {name}")
+        resize = variant.resize
+        if resize is not None:
+            resize = [int(resize[0]), int(resize[1])]
+            if min(resize) < 1:
+                raise ValueError(f"resize for variant {name} must be positive, not {variant.resize!r}")
+        normalized.append({
+            "name": name,
+            "bands": [variant.top_pixels, variant.bottom_pixels, variant.left_pixels, variant.right_pixels],
+            "resize": resize,
+        })
+    return normalized
+
+
+def iter_process_images(
     input_folder: str,
     output_folder: str,
     top_pixels: int = 0,
@@ -69,10 +1638,31 @@ def batch_process_images(
     left_pixels: int = 0,
     right_pixels: int = 0,
     extensions: list = None,
+    workers: int = 1,
+    executor: str = "process",
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    incremental: bool = False,
+    hash_contents: bool = False,
+    lossless_jpeg: bool = False,
+    recursive: bool = False,
+    large_images: bool = False,
+    output_format: str = None,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    stats: BatchStats = None,
+    report: str = None,
     progress_callback=None,
-) -> tuple:
+    cancel_event: threading.Event = None,
+) -> Iterator[ProcessResult]:
     """
-    Batch process all images in a folder.
+    Process all images in a folder, yielding a result as each file finishes.
+    
+    Files are discovered lazily and nothing is accumulated between files, so
+    processing starts immediately and memory use does not grow with the
+    size of the folder.
     
     Args:
         input_folder: Path to input folder containing images
@@ -81,52 +1671,206 @@ def batch_process_images(
         bottom_pixels: Pixels to crop from bottom
         left_pixels: Pixels to crop from left
         right_pixels: Pixels to crop from right
-        extensions: List of file extensions to process (default: common image formats)
-        progress_callback: Optional callback function(current, total, filename)
+        extensions: List of file extensions to process, matched
+            case-insensitively (default: common image formats)
+        workers: Number of files to process concurrently (None uses all CPUs).
+            With more than one worker, results arrive in completion order.
+        executor: "process" for a process pool or "thread" for a thread pool
+            when workers > 1; "pipeline" (or an ImagePipeline instance, to
+            read its stage counters) overlaps reading, transforming and
+            writing in threaded stages, using workers transform threads
+        backend: "pillow" (default) or "numpy" crop/mirror implementation
+        preserve_mode: Keep each source's mode; pass False to convert to RGB
+        incremental: Skip inputs whose size, mtime and options match the
+            manifest kept in output_folder and whose output still exists.
+            Every run records completed files in the manifest, so this
+            also resumes a run that was cancelled or crashed.
+        hash_contents: With incremental, also store a SHA-256 of each input
+            so files that were touched but not changed are still skipped
+        lossless_jpeg: For JPEG inputs whose bands are aligned to the iMCU
+            grid, move DCT blocks with jpegtran instead of decoding and
+            re-encoding; other files use the pixel path. Each result's
+            method field records which path was taken.
+        recursive: Also process subfolders, recreating the relative folder
+            structure under output_folder
+        large_images: Copy uncompressed TIFF, BMP and PPM/PGM files
+            straight to the output and rewrite only the edge bands, a row
+            at a time, so memory use depends on the band size rather than
+            the image size. Other files use the pixel path.
+        output_format: Extension to write every output with, e.g. "png"
+            or "jpg" (default: keep each input's format). Inputs in another
+            format are always decoded and re-encoded.
+        profile: Encoder profile for re-encoded outputs: "fast" (least
+            encoding time), "balanced" (default) or "smallest" (smallest
+            files); see ENCODER_PROFILES. EXIF and ICC data are kept.
+        variants: List of Variant (or dicts of its fields) to produce from
+            each input instead of the single crop given by the *_pixels
+            arguments. Every input is decoded once and each variant is
+            written to output_folder/<variant name>/, optionally resized.
+        shard_index: Which shard of the input to process, from 0 to
+            shard_count - 1
+        shard_count: Split the input into this many disjoint shards by a
+            hash of each file's relative path (see shard_of), so several
+            machines can share one folder. Each shard keeps its own
+            manifest journal and report; merge them with merge_shards.py.
+        stats: BatchStats to add every result to (per-stage timings, bytes
+            and pixel counts)
+        report: "json" to write a BatchStats summary, or "csv" to write one
+            row of timings per file, to image_cropper_report.json/.csv in
+            output_folder
+        progress_callback: Optional callback function(current, total, filename),
+            called as each file completes. total is None until discovery
+            has finished.
+        cancel_event: threading.Event; once set, no further files are
+            started and iteration ends after the files in flight finish.
+            Outputs are written to a temporary file and renamed into
+            place, so a cancelled or crashed run never leaves a partial
+            image behind.
     
-    Returns:
-        Tuple of (successful_count, failed_count, error_messages)
+    Yields:
+        ProcessResult for each file
     """
-    if extensions is None:
-        extensions = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff"]
-    
     input_path = Path(input_folder)
     output_path = Path(output_folder)
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard_index must be from 0 to {shard_count - 1}, not {shard_index}")
+    shard = (shard_index, shard_count) if shard_count > 1 else None
     output_path.mkdir(parents=True, exist_ok=True)
+    image_files = discover_images(input_path, extensions, recursive, exclude=output_path)
+    if shard is not None:
+        image_files = (
+            path for path in image_files if shard_of(path.relative_to(input_path), shard_count) == shard_index
+        )
+    image_files = _DiscoveryCounter(image_files)
     
-    # Find all matching image files
-    image_files = []
-    for ext in extensions:
-        image_files.extend(input_path.glob(f"*{ext}"))
-        image_files.extend(input_path.glob(f"*{ext.upper()}"))
+    options = _batch_options(
+        top_pixels, bottom_pixels, left_pixels, right_pixels,
+        backend, preserve_mode, lossless_jpeg, large_images, output_format, profile, variants,
+    )
+    if report not in (None, "json", "csv"):
+        raise ValueError(f"report must be 'json' or 'csv', not {report!r}")
+    if stats is None and report == "json":
+        stats = BatchStats()
+    report_file = None
+    if report is not None:
+        report_file = output_path / f"{REPORT_NAME}.{report}"
+        if shard is not None:
+            report_file = report_file.with_name(shard_file_name(report_file.name, *shard))
+    csv_file = csv_writer = None
+    if report == "csv":
+        csv_file = open(report_file, "w", newline="", encoding="utf-8")
+        csv_writer = csv.DictWriter(csv_file, fieldnames=_CSV_FIELDS)
+        csv_writer.writeheader()
+    
+    # Always journal completed files, so an interrupted run can be resumed
+    # by running again with incremental=True
+    manifest = ProcessManifest(input_path, output_path, hash_contents, shard)
+    try:
+        results = _iter_results(
+            image_files, input_path, output_path, options, workers, executor, manifest,
+            skip_current=incremental, cancel_event=cancel_event,
+        )
+        for idx, result in enumerate(results, 1):
+            if stats is not None:
+                stats.add(result)
+            if csv_writer is not None:
+                csv_writer.writerow(_csv_row(result))
+            if progress_callback:
+                progress_callback(idx, image_files.total, result.path.name)
+            yield result
+    finally:
+        manifest.close()
+        if csv_file is not None:
+            csv_file.close()
+        if stats is not None:
+            stats.finish()
+            if report == "json":
+                stats.write_json(report_file)
+
+
+def batch_process_images(
+    input_folder: str,
+    output_folder: str,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    extensions: list = None,
+    progress_callback=None,
+    workers: int = 1,
+    executor: str = "process",
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    incremental: bool = False,
+    hash_contents: bool = False,
+    lossless_jpeg: bool = False,
+    recursive: bool = False,
+    large_images: bool = False,
+    output_format: str = None,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    stats: BatchStats = None,
+    report: str = None,
+    cancel_event: threading.Event = None,
+) -> tuple:
+    """
+    Batch process all images in a folder.
     
-    image_files = sorted(set(image_files))  # Remove duplicates and sort
+    Args:
+        input_folder: Path to input folder containing images
+        output_folder: Path to output folder for processed images
+        top_pixels: Pixels to crop from top
+        bottom_pixels: Pixels to crop from bottom
+        left_pixels: Pixels to crop from left
+        right_pixels: Pixels to crop from right
+        extensions: List of file extensions to process (default: common image formats)
+        progress_callback: Optional callback function(current, total, filename),
+            called as each file completes; total is None until all files
+            have been found
+        
+        The remaining options are described in iter_process_images.
     
+    Returns:
+        Tuple of (successful_count, failed_count, error_messages); files
+        skipped as unchanged count as successful
+    """
     successful = 0
     failed = 0
     errors = []
     
-    for idx, image_file in enumerate(image_files, 1):
-        try:
-            if progress_callback:
-                progress_callback(idx, len(image_files), image_file.name)
-            
-            # Process the image
-            processed = crop_and_mirror(
-                str(image_file),
-                top_pixels=top_pixels,
-                bottom_pixels=bottom_pixels,
-                left_pixels=left_pixels,
-                right_pixels=right_pixels,
-            )
-            
-            # Save with original filename
-            output_file = output_path / image_file.name
-            processed.save(output_file, quality=95)
-            successful += 1
-        except Exception as e:
+    for result in iter_process_images(
+        input_folder,
+        output_folder,
+        top_pixels=top_pixels,
+        bottom_pixels=bottom_pixels,
+        left_pixels=left_pixels,
+        right_pixels=right_pixels,
+        extensions=extensions,
+        workers=workers,
+        executor=executor,
+        backend=backend,
+        preserve_mode=preserve_mode,
+        incremental=incremental,
+        hash_contents=hash_contents,
+        lossless_jpeg=lossless_jpeg,
+        recursive=recursive,
+        large_images=large_images,
+        output_format=output_format,
+        profile=profile,
+        variants=variants,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        stats=stats,
+        report=report,
+        progress_callback=progress_callback,
+        cancel_event=cancel_event,
+    ):
+        if result.status == "failed":
             failed += 1
-            error_msg = f"{image_file.name}: {str(e)}"
-            errors.append(error_msg)
+            errors.append(f"{result.path.name}: {str(result.error)}")
+        else:
+            successful += 1
     
     return successful, failed, errors
@@ -2,20 +2,44 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
+import multiprocessing
+import queue
 import threading
-from image_processor import batch_process_images
+from concurrent.futures import ThreadPoolExecutor
+from PIL import ImageTk
+from image_processor import BatchStats, batch_process_images, discover_images
+from preview import ThumbnailCache, render_preview
+
+# How often the UI drains events posted by the worker thread
+POLL_INTERVAL_MS = 100
+# Quiet time after the last crop value change before the preview is redrawn
+PREVIEW_DEBOUNCE_MS = 150
+# Most files offered in the preview picker
+PREVIEW_FILE_LIMIT = 1000
 
 
 class ImageCropperApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Batch Image Cropper & Mirrorer")
-        self.root.geometry("600x700")
+        self.root.geometry("1100x700")
         self.root.resizable(False, False)
         
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
         self.processing = False
+        self.cancel_event = threading.Event()
+        # Worker threads never touch Tk; they post events here instead
+        self.events = queue.Queue()
+        
+        # Preview renders run one at a time off the UI thread
+        self.thumbnail_cache = ThumbnailCache()
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_file = tk.StringVar()
+        self._preview_files = {}
+        self._preview_after = None
+        self._preview_generation = 0
+        self._preview_photos = ()
         
         self._create_widgets()
     
@@ -23,7 +47,7 @@ class ImageCropperApp:
         """Create and layout all GUI widgets."""
         # Main frame with padding
         main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.pack(side=tk.LEFT, fill=tk.Y)
         
         # Title
         title = ttk.Label(main_frame, text="Batch Image Cropper & Mirrorer", 
@@ -74,6 +98,22 @@ class ImageCropperApp:
         ttk.Label(values_frame, text="Right:").grid(row=1, column=2, sticky=tk.W, padx=5, pady=5)
         ttk.Spinbox(values_frame, from_=0, to=500, textvariable=self.right_var, width=10).grid(row=1, column=3, sticky=tk.W, padx=5, pady=5)
         
+        # Subfolders
+        self.recursive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            main_frame,
+            text="Include subfolders",
+            variable=self.recursive_var,
+        ).pack(anchor=tk.W, pady=(0, 5))
+        
+        # Incremental re-runs
+        self.skip_unchanged_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            main_frame,
+            text="Skip files unchanged since the last run",
+            variable=self.skip_unchanged_var,
+        ).pack(anchor=tk.W, pady=(0, 5))
+        
         # Info text
         info_text = "Specify the number of pixels to crop from each side.\nThose pixels will be mirrored to the opposite side."
         ttk.Label(main_frame, text=info_text, foreground="gray", font=("Helvetica", 9)).pack(anchor=tk.W, pady=(0, 15))
@@ -102,14 +142,40 @@ class ImageCropperApp:
         self.process_button = ttk.Button(main_frame, text="Process Images", command=self._process_images)
         self.process_button.pack(fill=tk.X, pady=(0, 5))
         
+        # Cancel button
+        self.cancel_button = ttk.Button(main_frame, text="Cancel", command=self._cancel, state=tk.DISABLED)
+        self.cancel_button.pack(fill=tk.X, pady=(0, 5))
+        
         # Clear button
         ttk.Button(main_frame, text="Clear Log", command=self._clear_log).pack(fill=tk.X)
+        
+        self._create_preview(ttk.Frame(self.root, padding="10"))
+        for var in (self.top_var, self.bottom_var, self.left_var, self.right_var):
+            var.trace_add("write", self._schedule_preview)
+    
+    def _create_preview(self, preview_frame):
+        """Create the before/after preview panel."""
+        preview_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        ttk.Label(preview_frame, text="Preview:", font=("Helvetica", 10, "bold")).pack(anchor=tk.W)
+        self.preview_picker = ttk.Combobox(preview_frame, textvariable=self.preview_file, state="readonly")
+        self.preview_picker.pack(fill=tk.X, pady=(0, 10))
+        self.preview_picker.bind("<<ComboboxSelected>>", self._schedule_preview)
+        
+        ttk.Label(preview_frame, text="Before", foreground="gray").pack(anchor=tk.W)
+        self.before_label = ttk.Label(preview_frame, text="Select an input folder to preview")
+        self.before_label.pack(pady=(0, 10))
+        
+        ttk.Label(preview_frame, text="After", foreground="gray").pack(anchor=tk.W)
+        self.after_label = ttk.Label(preview_frame)
+        self.after_label.pack()
     
     def _browse_input(self):
         """Browse for input folder."""
         folder = filedialog.askdirectory(title="Select Input Folder")
         if folder:
             self.input_folder.set(folder)
+            self._load_preview_files(folder)
     
     def _browse_output(self):
         """Browse for output folder."""
@@ -117,21 +183,113 @@ class ImageCropperApp:
         if folder:
             self.output_folder.set(folder)
     
+    def _load_preview_files(self, folder):
+        """Fill the preview picker with images from folder."""
+        self._preview_files = {}
+        for image_file in discover_images(folder, recursive=self.recursive_var.get()):
+            self._preview_files[image_file.relative_to(folder).as_posix()] = image_file
+            if len(self._preview_files) >= PREVIEW_FILE_LIMIT:
+                break
+        names = sorted(self._preview_files)
+        self.preview_picker.config(values=names)
+        self.preview_file.set(names[0] if names else "")
+        self._schedule_preview()
+    
+    def _schedule_preview(self, *_):
+        """Redraw the preview once the crop values stop changing."""
+        if self._preview_after is not None:
+            self.root.after_cancel(self._preview_after)
+        self._preview_after = self.root.after(PREVIEW_DEBOUNCE_MS, self._start_preview)
+    
+    def _start_preview(self):
+        """Render the preview for the current settings in the background."""
+        self._preview_after = None
+        path = self._preview_files.get(self.preview_file.get())
+        if path is None:
+            return
+        try:
+            crop = (self.top_var.get(), self.bottom_var.get(), self.left_var.get(), self.right_var.get())
+        except tk.TclError:
+            return  # A spinbox is mid-edit; wait for a valid number
+        
+        # Results from renders started before this one are discarded
+        self._preview_generation += 1
+        future = self.preview_executor.submit(render_preview, self.thumbnail_cache, path, *crop)
+        self.root.after(POLL_INTERVAL_MS // 4, self._show_preview, future, self._preview_generation)
+    
+    def _show_preview(self, future, generation):
+        """Display a finished preview render (main thread only)."""
+        if not future.done():
+            self.root.after(POLL_INTERVAL_MS // 4, self._show_preview, future, generation)
+            return
+        if generation != self._preview_generation:
+            return
+        try:
+            before, after = future.result()
+        except Exception as e:
+            self._preview_photos = ()
+            self.before_label.config(image="", text=f"Cannot preview: {e}")
+            self.after_label.config(image="")
+            return
+        # Tk only holds a weak reference, so keep the photos alive here
+        self._preview_photos = (ImageTk.PhotoImage(before), ImageTk.PhotoImage(after))
+        self.before_label.config(image=self._preview_photos[0], text="")
+        self.after_label.config(image=self._preview_photos[1])
+    
     def _log(self, message):
-        """Add message to log."""
+        """Add message to log (main thread only)."""
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    
+    def _post_log(self, message):
+        """Queue a log message from the worker thread."""
+        self.events.put(("log", message))
     
     def _clear_log(self):
         """Clear log text."""
         self.log_text.delete("1.0", tk.END)
     
     def _progress_callback(self, current, total, filename):
-        """Update progress during processing."""
-        self.progress["value"] = (current / total) * 100
-        self.status_label.config(text=f"Processing: {filename} ({current}/{total})")
-        self.root.update_idletasks()
+        """Queue a progress update from the worker thread."""
+        self.events.put(("progress", current, total, filename))
+    
+    def _show_progress(self, current, total, filename):
+        """Update progress widgets (main thread only)."""
+        if total is None:
+            # Still discovering files, so the total is not known yet
+            self.progress.config(mode="indeterminate")
+            self.progress.step()
+            self.status_label.config(text=f"Processing: {filename} ({current})")
+        else:
+            self.progress.config(mode="determinate")
+            self.progress["value"] = (current / total) * 100
+            self.status_label.config(text=f"Processing: {filename} ({current}/{total})")
+    
+    def _poll_events(self):
+        """Drain worker events, applying only the latest progress and one log insert per poll."""
+        log_lines = []
+        progress = None
+        finished = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "log":
+                log_lines.append(event[1])
+            elif event[0] == "progress":
+                progress = event[1:]
+            else:
+                finished = event
+        
+        if log_lines:
+            self._log("\n".join(log_lines))
+        if progress is not None:
+            self._show_progress(*progress)
+        if finished is None:
+            self.root.after(POLL_INTERVAL_MS, self._poll_events)
+        else:
+            self._finish(*finished)
     
     def _process_images(self):
         """Process images in background thread."""
@@ -153,63 +311,108 @@ class ImageCropperApp:
             messagebox.showerror("Error", "Input folder does not exist")
             return
         
+        try:
+            settings = dict(
+                input_folder=self.input_folder.get(),
+                output_folder=self.output_folder.get(),
+                top_pixels=self.top_var.get(),
+                bottom_pixels=self.bottom_var.get(),
+                left_pixels=self.left_var.get(),
+                right_pixels=self.right_var.get(),
+                incremental=self.skip_unchanged_var.get(),
+                recursive=self.recursive_var.get(),
+                cancel_event=self.cancel_event,
+            )
+        except tk.TclError:
+            messagebox.showerror("Error", "Crop values must be whole numbers")
+            return
+        
         # Disable button and start processing in thread
         self.process_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.cancel_event.clear()
         self.processing = True
         self.progress["value"] = 0
         self._clear_log()
         self._log("Starting batch processing...")
         
-        thread = threading.Thread(target=self._process_thread)
+        thread = threading.Thread(target=self._process_thread, args=(settings,), daemon=True)
         thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_events)
+    
+    def _cancel(self):
+        """Stop starting new files; those in progress are finished first."""
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...", foreground="blue")
+        self._log("Cancelling after the files in progress...")
     
-    def _process_thread(self):
-        """Background thread for image processing."""
+    def _process_thread(self, settings):
+        """Background thread for image processing; reports back only through self.events."""
         try:
-            top = self.top_var.get()
-            bottom = self.bottom_var.get()
-            left = self.left_var.get()
-            right = self.right_var.get()
+            top = settings["top_pixels"]
+            bottom = settings["bottom_pixels"]
+            left = settings["left_pixels"]
+            right = settings["right_pixels"]
             
             if top == 0 and bottom == 0 and left == 0 and right == 0:
-                self._log("Warning: All crop values are 0. No changes will be made.")
+                self._post_log("Warning: All crop values are 0. No changes will be made.")
             
-            self._log(f"Crop settings - Top: {top}, Bottom: {bottom}, Left: {left}, Right: {right}")
-            self._log("")
+            self._post_log(f"Crop settings - Top: {top}, Bottom: {bottom}, Left: {left}, Right: {right}")
+            self._post_log("")
             
+            stats = BatchStats()
             successful, failed, errors = batch_process_images(
-                self.input_folder.get(),
-                self.output_folder.get(),
-                top_pixels=top,
-                bottom_pixels=bottom,
-                left_pixels=left,
-                right_pixels=right,
                 progress_callback=self._progress_callback,
+                stats=stats,
+                **settings,
             )
             
-            self._log("")
-            self._log(f"Processing complete!")
-            self._log(f"Successful: {successful}")
-            self._log(f"Failed: {failed}")
+            self._post_log("")
+            if self.cancel_event.is_set():
+                self._post_log("Processing cancelled. Tick \"Skip files unchanged since the last run\" to resume.")
+            else:
+                self._post_log(f"Processing complete!")
+            self._post_log(f"Successful: {successful}")
+            self._post_log(f"Failed: {failed}")
+            
+            summary = stats.as_dict()
+            if summary["stage_share"]:
+                shares = ", ".join(
+                    f"{stage} {share:.0%}" for stage, share in summary["stage_share"].items() if share
+                )
+                self._post_log(f"Time by stage: {shares} ({summary['images_per_sec']:.1f} images/sec)")
             
             if errors:
-                self._log("")
-                self._log("Errors:")
+                self._post_log("")
+                self._post_log("Errors:")
                 for error in errors:
-                    self._log(f"  - {error}")
+                    self._post_log(f"  - {error}")
             
-            self.status_label.config(text=f"Complete - {successful} successful, {failed} failed", foreground="green")
-            messagebox.showinfo("Complete", f"Batch processing complete!\n\nSuccessful: {successful}\nFailed: {failed}")
+            self.events.put(("cancelled" if self.cancel_event.is_set() else "done", successful, failed))
         
         except Exception as e:
-            self._log(f"Error: {str(e)}")
-            self.status_label.config(text="Error occurred", foreground="red")
-            messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
+            self._post_log(f"Error: {str(e)}")
+            self.events.put(("error", str(e)))
+    
+    def _finish(self, kind, *details):
+        """Restore the UI once the worker thread has finished (main thread only)."""
+        self.processing = False
+        self.process_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress.config(mode="determinate")
+        self.progress["value"] = 0
         
-        finally:
-            self.processing = False
-            self.process_button.config(state=tk.NORMAL)
-            self.progress["value"] = 0
+        if kind == "done":
+            successful, failed = details
+            self.status_label.config(text=f"Complete - {successful} successful, {failed} failed", foreground="green")
+            messagebox.showinfo("Complete", f"Batch processing complete!\n\nSuccessful: {successful}\nFailed: {failed}")
+        elif kind == "cancelled":
+            successful, failed = details
+            self.status_label.config(text=f"Cancelled - {successful} successful, {failed} failed", foreground="orange")
+        else:
+            self.status_label.config(text="Error occurred", foreground="red")
+            messagebox.showerror("Error", f"An error occurred:\n{details[0]}")
 
 
 def main():
@@ -219,4 +422,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for process pools in the frozen .exe
     main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Combine the manifests and reports written by the shards of a batch.
+
+A run with shard_count > 1 journals its manifest to
+.image_cropper_manifest.shard-I-of-N.jsonl and writes its report to
+image_cropper_report.shard-I-of-N.json/.csv, so machines sharing one
+output folder never write to the same file. Once the shards have
+finished, merging folds the journals into the main manifest (so
+incremental runs, sharded or not, skip every merged file) and writes one
+combined JSON summary and/or CSV report.
+
+Run: python merge_shards.py OUTPUT [--json]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from image_processor import MANIFEST_NAME, REPORT_NAME, BatchStats, ProcessManifest
+
+_SHARD_TAG = re.compile(r"\.shard-(\d+)-of-(\d+)\.")
+
+
+def _shard_files(folder: Path, name: str) -> list:
+    """Return [(index, count, path)] for the shard files of name, in shard order."""
+    stem, _, extension = name.rpartition(".")
+    found = []
+    for path in folder.glob(f"{stem}.shard-*-of-*.{extension}"):
+        match = _SHARD_TAG.search(path.name)
+        if match:
+            found.append((int(match.group(1)), int(match.group(2)), path))
+    return sorted(found)
+
+
+def _missing(found: list) -> list:
+    """Shards ("I/N") absent from found, for each shard count that appears in it."""
+    counts = {count for _, count, _ in found}
+    present = {(index, count) for index, count, _ in found}
+    return [f"{index}/{count}" for count in sorted(counts) for index in range(count) if (index, count) not in present]
+
+
+def merge_manifests(output_folder) -> int:
+    """
+    Fold every shard journal into the main manifest and delete the journals.
+
+    Returns:
+        Number of input files recorded in the shard journals
+    """
+    output_path = Path(output_folder)
+    journals = _shard_files(output_path, MANIFEST_NAME)
+    if not journals:
+        return 0
+    # The input folder only matters for relative keys, which are stored already
+    manifest = ProcessManifest(output_path, output_path)
+    merged = set()
+    for _, _, journal in journals:
+        with open(journal, encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from an interrupted shard
+                manifest.entries[entry["input"]] = entry
+                merged.add(entry["input"])
+
+    temp_path = manifest.path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as fp:
+        for entry in manifest.entries.values():
+            fp.write(json.dumps(entry) + "\n")
+    os.replace(temp_path, manifest.path)
+    for _, _, journal in journals:
+        journal.unlink()
+    return len(merged)
+
+
+def merge_reports(output_folder) -> dict:
+    """
+    Write one JSON summary and/or CSV report from the shards' reports.
+
+    The shard reports are left in place, so merging again after a shard is
+    re-run gives an up-to-date result. Wall time in the summary is that of
+    the slowest shard, since shards run side by side.
+
+    Returns:
+        The merged summary (as BatchStats.as_dict), with a "shards" entry
+        listing the shards merged and any that are missing; empty if no
+        shard wrote a JSON report
+    """
+    output_path = Path(output_folder)
+    summary = {}
+    reports = _shard_files(output_path, f"{REPORT_NAME}.json")
+    if reports:
+        stats = BatchStats.from_dict(json.loads(reports[0][2].read_text(encoding="utf-8")))
+        for _, _, path in reports[1:]:
+            stats.merge(BatchStats.from_dict(json.loads(path.read_text(encoding="utf-8"))))
+        summary = stats.as_dict()
+        summary["shards"] = {
+            "merged": [f"{index}/{count}" for index, count, _ in reports],
+            "missing": _missing(reports),
+        }
+        (output_path / f"{REPORT_NAME}.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    rows = _shard_files(output_path, f"{REPORT_NAME}.csv")
+    if rows:
+        with open(output_path / f"{REPORT_NAME}.csv", "w", newline="", encoding="utf-8") as out:
+            writer = None
+            for _, _, path in rows:
+                with open(path, newline="", encoding="utf-8") as fp:
+                    reader = csv.DictReader(fp)
+                    if writer is None:
+                        writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+                        writer.writeheader()
+                    writer.writerows(reader)
+    return summary
+
+
+def merge_shards(output_folder) -> dict:
+    """
+    Merge the manifests and reports of every shard in output_folder.
+
+    Returns:
+        The merged summary from merge_reports, plus "manifest_entries": the
+        number of entries folded into the main manifest
+    """
+    summary = merge_reports(output_folder)
+    summary["manifest_entries"] = merge_manifests(output_folder)
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Merge the per-shard manifests and reports in an output folder.")
+    parser.add_argument("output", help="Output folder the shards wrote to")
+    parser.add_argument("--json", action="store_true", help="Print the merged summary as JSON")
+    args = parser.parse_args(argv)
+
+    if not Path(args.output).is_dir():
+        print(f"error: output folder does not exist: {args.output}", file=sys.stderr)
+        return 2
+    summary = merge_shards(args.output)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Merged {summary['manifest_entries']} manifest entries")
+        if "shards" in summary:
+            print(f"{summary['files']} files from shards {', '.join(summary['shards']['merged'])} "
+                  f"in {summary['wall_seconds']:.2f}s ({summary['images_per_sec']:.1f} images/sec)")
+            if summary["shards"]["missing"]:
+                print(f"warning: no report from shards {', '.join(summary['shards']['missing'])}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Downscaled before/after previews for the GUI.
+
+Previews are rendered from a small proxy of each source image instead of
+the full-resolution pixels. JPEGs are decoded at reduced scale by the codec
+itself (draft mode), other formats are shrunk with Image.reduce, and the
+proxies are kept in a memory-bounded LRU cache so changing a crop value
+only re-runs the cheap transform on the proxy.
+"""
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from image_processor import transform_image
+
+DEFAULT_PREVIEW_SIZE = (460, 300)
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Modes Tk can show directly; anything else is converted once when cached
+_DISPLAY_MODES = ("RGB", "RGBA", "L")
+
+
+def _image_nbytes(img: Image.Image) -> int:
+    """Approximate memory held by an image's pixel data."""
+    return img.width * img.height * len(img.getbands())
+
+
+def load_proxy(path, max_size: tuple = DEFAULT_PREVIEW_SIZE) -> tuple:
+    """
+    Decode a downscaled copy of an image that fits within max_size.
+
+    Args:
+        path: Image file to read
+        max_size: (width, height) box the proxy must fit in
+
+    Returns:
+        (proxy image, (width, height) of the full-resolution source)
+    """
+    with open(path, "rb") as fp:
+        img = Image.open(fp)
+        original_size = img.size
+        if img.format == "JPEG":
+            # Let libjpeg skip the DCT scales we don't need (1/2, 1/4 or 1/8)
+            img.draft(img.mode if img.mode in ("RGB", "L") else None, max_size)
+        # thumbnail() reduces by whole factors first, then resamples the rest
+        img.thumbnail(max_size, reducing_gap=2.0)
+        img.load()
+
+    if img.mode not in _DISPLAY_MODES:
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    return img, original_size
+
+
+class ThumbnailCache:
+    """
+    LRU cache of preview proxies, bounded by the memory their pixels use.
+
+    Entries are keyed by path, modification time, file size and proxy size,
+    so an image that changes on disk is decoded again automatically.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, max_size: tuple = DEFAULT_PREVIEW_SIZE) -> tuple:
+        """
+        Return (proxy, original size) for path, decoding it on a miss.
+
+        Args:
+            path: Image file to preview
+            max_size: (width, height) box the proxy must fit in
+
+        Returns:
+            Same as load_proxy. The proxy is shared, so callers must not
+            modify it in place.
+        """
+        stat = Path(path).stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size, tuple(max_size))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Decode outside the lock; two threads racing on the same key just
+        # both decode it once
+        entry = load_proxy(path, max_size)
+        size = _image_nbytes(entry[0])
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.nbytes += size
+            # Always keep the newest entry, even if it alone exceeds the budget
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (old, _) = self._entries.popitem(last=False)
+                self.nbytes -= _image_nbytes(old)
+        return entry
+
+    def clear(self) -> None:
+        """Drop every cached proxy."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def _scale_band(pixels: int, scale: float) -> int:
+    # Keep a non-zero band visible even when it shrinks below one proxy pixel
+    return max(1, round(pixels * scale)) if pixels > 0 else 0
+
+
+def render_preview(
+    cache: ThumbnailCache,
+    path,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    max_size: tuple = DEFAULT_PREVIEW_SIZE,
+) -> tuple:
+    """
+    Render a before/after preview of crop_and_mirror for one image.
+
+    Crop values are given in full-resolution pixels and scaled to the proxy,
+    so the preview matches what batch processing will produce.
+
+    Args:
+        cache: ThumbnailCache holding the proxies
+        path: Image file to preview
+        top_pixels: Pixels to crop from top and mirror to bottom
+        bottom_pixels: Pixels to crop from bottom and mirror to top
+        left_pixels: Pixels to crop from left and mirror to right
+        right_pixels: Pixels to crop from right and mirror to left
+        max_size: (width, height) box the preview must fit in
+
+    Returns:
+        (before, after) PIL Images of the same size
+    """
+    proxy, (width, height) = cache.get(path, max_size)
+    scale_x = proxy.width / width
+    scale_y = proxy.height / height
+    after = transform_image(
+        proxy,
+        _scale_band(top_pixels, scale_y),
+        _scale_band(bottom_pixels, scale_y),
+        _scale_band(left_pixels, scale_x),
+        _scale_band(right_pixels, scale_x),
+    )
+    return proxy, after
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Local HTTP service that crops and mirrors images sent to it.
+
+Tools that need crop/mirror as a service POST the encoded image and get
+the processed image back, instead of each importing the processor and
+paying its start-up cost. Work runs in a pool of worker processes that is
+started and warmed up before the first request is accepted. At most
+max_pending requests are admitted at once; further requests are refused
+with 503 and a Retry-After header straight away, before their body is
+read, rather than queueing without bound, so callers can back off.
+
+Endpoints:
+    POST /process?top=50&left=20[&bottom=&right=&format=png&profile=fast&backend=numpy]
+        Body: encoded image bytes. Returns the processed image in the
+        source's format unless format (a file extension) is given.
+    GET /metrics   JSON counters, request latency and queue depth
+    GET /health    200 once the worker pool is warm
+
+Run: python server.py [--port 8765] [-j WORKERS] [--max-pending N]
+
+Binds to 127.0.0.1 by default. There is no authentication, so only bind
+to another interface on a trusted network.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from image_processor import (
+    DEFAULT_PROFILE,
+    ProcessResult,
+    _BAND_OPTIONS,
+    _format_for_path,
+    _multi_frame_step,
+    encoder_params,
+    transform_image,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+LATENCY_WINDOW = 1024  # Recent requests the latency percentiles are computed over
+
+# Errors caused by the uploaded image (undecodable, truncated, too many pixels)
+_CLIENT_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+_BAND_PARAMS = {"top": "top_pixels", "bottom": "bottom_pixels", "left": "left_pixels", "right": "right_pixels"}
+
+
+class ServiceBusy(Exception):
+    """Raised when max_pending requests are already admitted."""
+
+
+def _warm_worker() -> None:
+    # Load every Pillow codec plugin once per worker, not on its first request
+    Image.init()
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _process_bytes(data: bytes, params: dict) -> tuple:
+    """
+    Crop/mirror encoded image bytes; runs inside pool workers.
+
+    Returns:
+        (processed bytes, Pillow format name of the output)
+    """
+    format = params.get("format") or Image.open(io.BytesIO(data)).format or "PNG"
+    # Animations and multi-page files keep every frame
+    options = {key: params.get(key, 0) for key in _BAND_OPTIONS}
+    options.update(backend=params.get("backend", "pillow"), preserve_mode=True, profile=params["profile"])
+    buffer = io.BytesIO()
+    if _multi_frame_step(ProcessResult(Path("upload"), "ok"), data, buffer, options, format=format):
+        return buffer.getvalue(), format
+    return transform_image(data, **{**params, "format": format}), format
+
+
+def parse_params(query: str) -> dict:
+    """
+    Turn a /process query string into transform_image keyword arguments.
+
+    Raises:
+        ValueError: For unknown names or invalid values
+    """
+    params = {"profile": DEFAULT_PROFILE}
+    for name, values in parse_qs(query, strict_parsing=False).items():
+        value = values[-1]
+        if name in _BAND_PARAMS:
+            pixels = int(value)
+            if pixels < 0:
+                raise ValueError(f"{name} must be 0 or more, not {pixels}")
+            params[_BAND_PARAMS[name]] = pixels
+        elif name == "format":
+            params["format"] = _format_for_path("image." + value.lower().lstrip("."))
+        elif name == "profile":
+            encoder_params("PNG", value)  # Raises ValueError for unknown profiles
+            params["profile"] = value
+        elif name == "backend":
+            if value not in ("pillow", "numpy"):
+                raise ValueError(f"backend must be 'pillow' or 'numpy', not {value!r}")
+            params["backend"] = value
+        else:
+            raise ValueError(f"unknown parameter: {name}")
+    return params
+
+
+class ServiceMetrics:
+    """Thread-safe request counters and a window of recent latencies."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.responses = {}
+        self.rejected = 0
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def admitted(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, status: int, seconds: float, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.responses[int(status)] = self.responses.get(int(status), 0) + 1
+            self.latencies.append(seconds)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def refused(self, status: int) -> None:
+        """Count a request answered without being admitted (busy or invalid)."""
+        with self._lock:
+            self.responses[int(status)] = self.responses.get(int(status), 0) + 1
+            if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                self.rejected += 1
+
+    def as_dict(self, workers: int) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            in_flight = self.in_flight
+            snapshot = {
+                "uptime_seconds": time.perf_counter() - self.started,
+                "responses": {str(status): count for status, count in sorted(self.responses.items())},
+                "rejected": self.rejected,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(round(fraction * (len(latencies) - 1))))] * 1000
+
+        snapshot.update(
+            workers=workers,
+            in_flight=in_flight,
+            # Admitted requests beyond one per worker are waiting for a worker
+            queue_depth=max(0, in_flight - workers),
+            latency_ms={
+                "count": len(latencies),
+                "mean": sum(latencies) / len(latencies) * 1000,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": latencies[-1] * 1000,
+            } if latencies else {"count": 0},
+        )
+        return snapshot
+
+
+class ProcessingService:
+    """
+    Warm pool of worker processes with a bound on admitted requests.
+
+    Usable without HTTP as well: process() blocks until the image is done
+    and raises ServiceBusy instead of queueing past max_pending.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.max_bytes = max_bytes
+        self.metrics = ServiceMetrics()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def warm(self) -> None:
+        """Start every worker process now rather than on the first requests."""
+        wait([self._pool.submit(_worker_pid) for _ in range(self.workers)])
+
+    def admit(self) -> float:
+        """
+        Take one of the max_pending request slots without waiting.
+
+        Every successful admit() must be paired with a release().
+
+        Returns:
+            The admission time, to pass back to release()
+
+        Raises:
+            ServiceBusy: If max_pending requests are already in progress
+        """
+        if not self._slots.acquire(blocking=False):
+            self.metrics.refused(HTTPStatus.SERVICE_UNAVAILABLE)
+            raise ServiceBusy(f"{self.max_pending} requests already in progress")
+        self.metrics.admitted()
+        return time.perf_counter()
+
+    def release(self, start: float, status: int, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        """Free a slot taken by admit() and record how its request ended."""
+        self._slots.release()
+        self.metrics.finished(status, time.perf_counter() - start, bytes_in, bytes_out)
+
+    def run(self, data: bytes, params: dict) -> tuple:
+        """Crop/mirror one encoded image in a worker; the caller must hold a slot."""
+        return self._pool.submit(_process_bytes, data, params).result()
+
+    def process(self, data: bytes, params: dict) -> tuple:
+        """
+        Crop/mirror one encoded image in a worker.
+
+        Returns:
+            (processed bytes, Pillow format name of the output)
+
+        Raises:
+            ServiceBusy: If max_pending requests are already in progress
+        """
+        start = self.admit()
+        status, output = HTTPStatus.INTERNAL_SERVER_ERROR, b""
+        try:
+            output, format = self.run(data, params)
+            status = HTTPStatus.OK
+            return output, format
+        except _CLIENT_ERRORS:
+            status = HTTPStatus.BAD_REQUEST
+            raise
+        finally:
+            self.release(start, status, len(data), len(output))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ImageCropper/1.0"
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse connections
+
+    @property
+    def service(self) -> ProcessingService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: dict = None) -> None:
+        self._send(status, json.dumps(payload, indent=2).encode("utf-8"), "application/json", headers)
+
+    def _refuse(self, status: int, message: str, headers: dict = None) -> None:
+        self.service.metrics.refused(status)
+        self._send_json(status, {"error": message}, headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send_json(HTTPStatus.OK, self.service.metrics.as_dict(self.service.workers))
+        elif path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"no such endpoint: {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/process":
+            self.close_connection = True  # The unread body would corrupt the next request
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"no such endpoint: {url.path}"})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self._refuse(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+            return
+        length = int(length)
+        if length > self.service.max_bytes:
+            self.close_connection = True
+            self._refuse(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"images are limited to {self.service.max_bytes} bytes")
+            return
+        try:
+            params = parse_params(url.query)
+        except ValueError as e:
+            self.close_connection = True
+            self._refuse(HTTPStatus.BAD_REQUEST, str(e))
+            return
+
+        # Take a slot before reading the body, so refused uploads never reach memory
+        try:
+            start = self.service.admit()
+        except ServiceBusy as e:
+            self.close_connection = True
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        status, data, output = HTTPStatus.INTERNAL_SERVER_ERROR, b"", b""
+        try:
+            data = self.rfile.read(length)
+            if len(data) < length:
+                self.close_connection = True
+                status = HTTPStatus.BAD_REQUEST
+                self._send_json(status, {"error": f"body ended after {len(data)} of {length} bytes"})
+                return
+            output, format = self.service.run(data, params)
+            status = HTTPStatus.OK
+        except _CLIENT_ERRORS as e:
+            status = HTTPStatus.BAD_REQUEST
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+            return
+        finally:
+            self.service.release(start, status, len(data), len(output))
+        self._send(HTTPStatus.OK, output, Image.MIME.get(format, "application/octet-stream"))
+
+
+def make_server(
+    service: ProcessingService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    verbose: bool = False,
+) -> ThreadingHTTPServer:
+    """
+    Create (but do not start) an HTTP server in front of service.
+
+    Port 0 picks a free port; read it back from server.server_address.
+    Call serve_forever() to run it and shutdown() from another thread to
+    stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve crop/mirror over HTTP from a warm worker pool.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Interface to bind (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Requests admitted at once before answering 503 (default: 4 per worker)")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help="Largest accepted upload in MB (default: 256)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request to stderr")
+    args = parser.parse_args(argv)
+
+    with ProcessingService(args.workers, args.max_pending, int(args.max_mb * 1024 * 1024)) as service:
+        service.warm()
+        server = make_server(service, args.host, args.port, args.verbose)
+        host, port = server.server_address[:2]
+        print(f"Serving on http://{host}:{port} with {service.workers} workers "
+              f"(max {service.max_pending} pending); Ctrl+C to stop", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,16 @@
 Test script to verify the image processor works correctly.
 This creates sample test images and processes them.
 """
+import io
 from PIL import Image, ImageDraw
 from pathlib import Path
-from image_processor import crop_and_mirror, batch_process_images
+from image_processor import (
+    batch_process_images,
+    crop_and_mirror,
+    crop_and_mirror_stack,
+    iter_process_images,
+    transform_image,
+)
 
 
 def create_test_images(output_dir: str, count: int = 3):
@@ -97,6 +104,902 @@ def test_batch_process():
     print(f"  Output folder: {output_dir}")
 
 
+def test_batch_process_parallel():
+    """Test batch processing with thread and process pools."""
+    input_dir = Path("test_input")
+    create_test_images(str(input_dir))
+    
+    print("\nTesting parallel batch processing:")
+    for executor in ("thread", "process"):
+        seen = []
+        successful, failed, errors = batch_process_images(
+            str(input_dir),
+            f"test_output_{executor}",
+            top_pixels=25,
+            left_pixels=15,
+            progress_callback=lambda current, total, filename: seen.append(current),
+            workers=2,
+            executor=executor,
+        )
+        assert failed == 0, errors
+        assert successful == len(seen) == 3
+        assert seen == [1, 2, 3]
+        print(f"✓ {executor} pool processed {successful} images")
+
+
+def test_iter_process_images():
+    """Test the streaming per-file results API."""
+    input_dir = Path("test_input_stream")
+    create_test_images(str(input_dir))
+    (input_dir / "broken.png").write_bytes(b"not an image")
+    
+    print("\nTesting iter_process_images:")
+    results = {
+        result.path.name: result
+        for result in iter_process_images(str(input_dir), "test_output_stream", top_pixels=10)
+    }
+    assert results["broken.png"].status == "failed"
+    assert results["broken.png"].error is not None
+    assert results["test_red.png"].ok
+    assert results["test_red.png"].bytes_written == results["test_red.png"].output_path.stat().st_size
+    print(f"✓ Streamed {len(results)} results")
+
+
+def test_transform_image_in_memory():
+    """Test the in-memory transform with each supported container."""
+    try:
+        import numpy as np
+    except ImportError:
+        print("\nSkipping transform_image test: numpy is not installed")
+        return
+    
+    test_dir = Path("test_input")
+    create_test_images(str(test_dir))
+    test_image = test_dir / "test_green.png"
+    expected = crop_and_mirror(str(test_image), top_pixels=12, right_pixels=7)
+    
+    print("\nTesting transform_image:")
+    with Image.open(test_image) as img:
+        assert transform_image(img, top_pixels=12, right_pixels=7).tobytes() == expected.tobytes()
+        array_result = transform_image(np.asarray(img), top_pixels=12, right_pixels=7)
+    assert isinstance(array_result, np.ndarray)
+    assert array_result.tobytes() == expected.tobytes()
+    
+    data = test_image.read_bytes()
+    bytes_result = transform_image(data, top_pixels=12, right_pixels=7)
+    assert isinstance(bytes_result, bytes)
+    assert Image.open(io.BytesIO(bytes_result)).tobytes() == expected.tobytes()
+    
+    file_result = transform_image(io.BytesIO(data), top_pixels=12, right_pixels=7)
+    assert Image.open(file_result).tobytes() == expected.tobytes()
+    print("✓ Image, array, bytes and file-like sources match crop_and_mirror")
+
+
+def test_numpy_backend():
+    """Test that the NumPy backend matches the Pillow backend pixel for pixel."""
+    try:
+        import numpy as np
+    except ImportError:
+        print("\nSkipping NumPy backend test: numpy is not installed")
+        return
+    
+    test_dir = Path("test_input")
+    create_test_images(str(test_dir))
+    
+    print("\nTesting NumPy backend:")
+    crops = [(30, 30, 20, 20), (0, 45, 0, 3), (400, 1, 400, 0)]
+    for test_image in sorted(test_dir.glob("test_*.png")):
+        for crop in crops:
+            expected = crop_and_mirror(str(test_image), *crop)
+            actual = crop_and_mirror(str(test_image), *crop, backend="numpy")
+            assert actual.tobytes() == expected.tobytes(), (test_image, crop)
+    
+    images = [np.asarray(Image.open(path).convert("RGB")) for path in sorted(test_dir.glob("test_*.png"))]
+    stacked = crop_and_mirror_stack(np.stack(images), 30, 30, 20, 20)
+    for image, result in zip(images, stacked):
+        expected = transform_image(image, 30, 30, 20, 20)
+        assert np.array_equal(result, expected)
+    print("✓ NumPy backend and stacked pass are pixel-identical to Pillow")
+
+
+def test_mode_preserved():
+    """Test that non-RGB modes survive the transform on both backends."""
+    print("\nTesting mode preservation:")
+    source = Image.new("RGBA", (64, 48), (10, 20, 30, 40))
+    ImageDraw.Draw(source).rectangle([0, 0, 63, 8], fill=(200, 100, 50, 128))
+    variants = {
+        "RGBA": source,
+        "L": source.convert("L"),
+        "P": source.convert("RGB").convert("P"),
+        "I;16": source.convert("L").convert("I;16"),
+        "CMYK": source.convert("RGB").convert("CMYK"),
+    }
+    for mode, img in variants.items():
+        original = img.tobytes()
+        expected = transform_image(img, 9, 4, 6, 3)
+        assert expected.mode == mode
+        assert img.tobytes() == original, "caller's image must not be modified"
+        if mode == "P":
+            assert expected.getpalette() == img.getpalette()
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            continue
+        assert transform_image(img, 9, 4, 6, 3, backend="numpy").tobytes() == expected.tobytes()
+    
+    assert transform_image(source, 9, preserve_mode=False).mode == "RGB"
+    png = io.BytesIO()
+    source.save(png, format="PNG")
+    jpeg = transform_image(png.getvalue(), 9, format="JPEG")
+    assert Image.open(io.BytesIO(jpeg)).mode == "RGB"
+    print("✓ RGBA, L, P, I;16 and CMYK modes preserved")
+
+
+def test_incremental_rerun():
+    """Test that unchanged inputs are skipped on a second incremental run."""
+    import os
+    
+    input_dir = Path("test_input_incremental")
+    output_dir = Path("test_output_incremental")
+    create_test_images(str(input_dir))
+    
+    print("\nTesting incremental re-runs:")
+    
+    def statuses(**kwargs):
+        results = iter_process_images(str(input_dir), str(output_dir), top_pixels=5, incremental=True, **kwargs)
+        return {result.path.name: result.status for result in results}
+    
+    assert set(statuses().values()) == {"ok"}
+    assert set(statuses().values()) == {"skipped"}
+    
+    # Changed crop values, a touched input and a deleted output all reprocess
+    assert set(statuses(bottom_pixels=3).values()) == {"ok"}
+    red = input_dir / "test_red.png"
+    os.utime(red, ns=(red.stat().st_atime_ns, red.stat().st_mtime_ns + 10**9))
+    (output_dir / "test_blue.png").unlink()
+    assert statuses(bottom_pixels=3) == {"test_red.png": "ok", "test_green.png": "skipped", "test_blue.png": "ok"}
+    
+    # With content hashes a touch alone is not a change
+    statuses(hash_contents=True)
+    os.utime(red, ns=(red.stat().st_atime_ns, red.stat().st_mtime_ns + 10**9))
+    assert statuses(hash_contents=True)["test_red.png"] == "skipped"
+    
+    # Pipelines record from their feeder and consumer threads at once
+    import threading
+    from image_processor import ProcessManifest
+    manifest = ProcessManifest(input_dir, "test_output_incremental_threads")
+    signature = ProcessManifest.signature(red)
+    
+    def record_many(prefix):
+        for idx in range(200):
+            manifest.record(input_dir / f"{prefix}{idx}.png", output_dir / "out.png", {}, signature)
+    
+    threads = [threading.Thread(target=record_many, args=(prefix,)) for prefix in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manifest.close()
+    assert len(ProcessManifest(input_dir, "test_output_incremental_threads").entries) == 400
+    print("✓ Unchanged files skipped, changed files reprocessed")
+
+
+def test_lossless_jpeg_fallback():
+    """Test iMCU alignment planning and the pixel fallback for JPEGs."""
+    import shutil
+    from image_processor import _jpeg_band_moves
+    
+    print("\nTesting lossless JPEG path selection:")
+    # 4:2:0 JPEGs have a 16x16 iMCU
+    assert _jpeg_band_moves((640, 480), (16, 16), (32, 16, 0, 48)) == [
+        ((640, 32, 0, 0), (0, 448)),
+        ((640, 16, 0, 464), (0, 0)),
+        ((48, 480, 592, 0), (0, 0)),
+    ]
+    assert _jpeg_band_moves((640, 480), (16, 16), (30, 0, 0, 0)) is None
+    assert _jpeg_band_moves((650, 480), (16, 16), (0, 0, 16, 0)) is None
+    # Bands thinner than an iMCU only work where they are dropped at the right/bottom edge
+    assert _jpeg_band_moves((4000, 3000), (16, 16), (0, 8, 0, 0)) is None
+    assert _jpeg_band_moves((650, 480), (16, 16), (0, 0, 0, 10)) is None
+    assert _jpeg_band_moves((4000, 3000), (16, 16), (8, 0, 0, 0)) == [((4000, 8, 0, 0), (0, 2992))]
+    
+    input_dir = Path("test_input_jpeg")
+    input_dir.mkdir(exist_ok=True)
+    Image.new("RGB", (640, 480), (90, 40, 10)).save(input_dir / "aligned.jpg", quality=90)
+    Image.new("RGB", (650, 470), (90, 40, 10)).save(input_dir / "unaligned.jpg", quality=90)
+    results = {
+        result.path.name: result
+        for result in iter_process_images(
+            str(input_dir), "test_output_jpeg", top_pixels=32, left_pixels=16, lossless_jpeg=True
+        )
+    }
+    assert all(result.ok for result in results.values())
+    assert results["unaligned.jpg"].method == "pixel"
+    expected = "jpeg-lossless" if shutil.which("jpegtran") else "pixel"
+    print(f"  aligned.jpg took the {results['aligned.jpg'].method} path (expected {expected})")
+    print("✓ JPEG path selection works")
+
+
+def test_recursive_discovery():
+    """Test recursive, case-insensitive discovery and mirrored output tree."""
+    from image_processor import discover_images
+    
+    input_dir = Path("test_input_tree")
+    create_test_images(str(input_dir / "a" / "b"))
+    Image.new("RGB", (40, 30)).save(input_dir / "UPPER.JPG")
+    (input_dir / "notes.txt").write_text("not an image")
+    # An output folder nested in the input must not be picked up as input
+    output_dir = input_dir / "out"
+    create_test_images(str(output_dir))
+    
+    print("\nTesting recursive discovery:")
+    assert {p.name for p in discover_images(str(input_dir))} == {"UPPER.JPG"}
+    found = {
+        path.relative_to(input_dir).as_posix()
+        for path in discover_images(str(input_dir), recursive=True, exclude=str(output_dir))
+    }
+    assert found == {"UPPER.JPG", "a/b/test_red.png", "a/b/test_green.png", "a/b/test_blue.png"}
+    
+    totals = []
+    successful, failed, errors = batch_process_images(
+        str(input_dir),
+        str(output_dir),
+        top_pixels=4,
+        recursive=True,
+        progress_callback=lambda current, total, filename: totals.append(total),
+    )
+    assert (successful, failed) == (4, 0), errors
+    assert totals[-1] == 4
+    assert (output_dir / "a" / "b" / "test_red.png").exists()
+    print("✓ Found and processed 4 images across subfolders")
+
+
+def test_pipeline_executor():
+    """Test the staged read/transform/write pipeline."""
+    from image_processor import ImagePipeline
+    
+    input_dir = Path("test_input_pipeline")
+    create_test_images(str(input_dir))
+    (input_dir / "broken.png").write_bytes(b"not an image")
+    
+    print("\nTesting pipelined executor:")
+    pipeline = ImagePipeline(read_threads=1, transform_threads=2, write_threads=1, queue_size=2)
+    results = {
+        result.path.name: result
+        for result in iter_process_images(str(input_dir), "test_output_pipeline", top_pixels=20, executor=pipeline)
+    }
+    assert results["broken.png"].status == "failed"
+    assert sum(result.ok for result in results.values()) == 3
+    expected = crop_and_mirror(str(input_dir / "test_red.png"), top_pixels=20)
+    assert Image.open(results["test_red.png"].output_path).tobytes() == expected.tobytes()
+    
+    stats = {stage["name"]: stage for stage in pipeline.stats()}
+    assert stats["read"]["processed"] == 4
+    assert stats["transform"]["processed"] == 4
+    assert stats["write"]["processed"] == 3
+    
+    # Abandoning the generator part way must not hang the stage threads
+    stream = iter_process_images(str(input_dir), "test_output_pipeline", executor="pipeline")
+    next(stream)
+    stream.close()
+    print("✓ Pipeline processed 3 images with per-stage counters")
+
+
+def test_band_stream():
+    """Test band-only streaming against the decoded pixel path."""
+    from band_stream import RawLayout, _patch_files, band_moves, stream_crop_and_mirror
+    
+    test_dir = Path("test_input_stream_bands")
+    test_dir.mkdir(exist_ok=True)
+    create_test_images(str(test_dir))
+    base = Image.open(test_dir / "test_red.png").convert("RGB").crop((0, 0, 397, 299))
+    ImageDraw.Draw(base).ellipse([40, 30, 300, 250], fill=(10, 200, 90))
+    samples = {
+        "rgb.bmp": base,  # Bottom-up rows padded to 4 bytes
+        "pal.bmp": base.convert("P"),
+        "rgb.ppm": base,
+        "gray.pgm": base.convert("L"),
+        "rgb.tiff": base,
+        "deep.tiff": base.convert("L").convert("I;16"),
+    }
+    for name, img in samples.items():
+        img.save(test_dir / name)
+    base.save(test_dir / "lzw.tiff", compression="tiff_lzw")
+    
+    print("\nTesting band-only streaming:")
+    crop = (31, 17, 45, 12)
+    for name in samples:
+        output = Path("test_output_stream_bands") / name
+        output.parent.mkdir(exist_ok=True)
+        assert stream_crop_and_mirror(test_dir / name, output, *crop), name
+        expected = crop_and_mirror(str(test_dir / name), *crop)
+        with Image.open(output) as result:
+            assert result.mode == expected.mode, name
+            assert result.tobytes() == expected.tobytes(), name
+    assert not stream_crop_and_mirror(test_dir / "lzw.tiff", Path("test_output_stream_bands") / "lzw.tiff", *crop)
+    
+    # The seek/read/write fallback for files that cannot be memory-mapped
+    layout = RawLayout.open(test_dir / "rgb.bmp")
+    fallback = Path("test_output_stream_bands") / "fallback.bmp"
+    fallback.write_bytes((test_dir / "rgb.bmp").read_bytes())
+    with open(test_dir / "rgb.bmp", "rb") as src, open(fallback, "r+b") as dst:
+        _patch_files(src, dst, layout, band_moves(layout.size, *crop))
+    assert fallback.read_bytes() == (Path("test_output_stream_bands") / "rgb.bmp").read_bytes()
+    
+    methods = {
+        result.path.name: result.method
+        for result in iter_process_images(str(test_dir), "test_output_stream_bands", *crop, large_images=True)
+    }
+    assert methods["rgb.bmp"] == methods["rgb.tiff"] == "band-stream"
+    assert methods["lzw.tiff"] == methods["test_red.png"] == "pixel"
+    print("✓ Streamed BMP, PPM, PGM and TIFF outputs match the pixel path")
+
+
+def test_benchmark_smoke():
+    """Test that the benchmark harness produces a complete report entry."""
+    import benchmark
+    
+    print("\nTesting benchmark harness:")
+    corpus = Path("test_input_bench")
+    files = benchmark.generate_corpus(str(corpus), {"tiny": (64, 48)}, ["png", "jpg"], count=1, seed=7)
+    again = benchmark.generate_corpus("test_input_bench_again", {"tiny": (64, 48)}, ["png"], count=1, seed=7)
+    assert files[0].read_bytes() == again[0].read_bytes(), "corpus must be reproducible"
+    
+    result = benchmark.bench_batch(str(corpus), (4, 4, 4, 4), workers=1, executor="process", backend="pillow")
+    assert result["images"] == 2
+    for key in ("images_per_sec", "mb_per_sec", "p50_ms", "p95_ms", "peak_rss_mb"):
+        assert key in result
+    print(f"✓ Benchmarked {result['images']} images at {result['images_per_sec']:.1f} img/s")
+
+
+def test_batch_stats_and_reports():
+    """Test per-stage timings, the stats object and the report files."""
+    import csv
+    import json
+    from image_processor import BatchStats
+    
+    input_dir = Path("test_input_stats")
+    output_dir = Path("test_output_stats")
+    create_test_images(str(input_dir))
+    
+    print("\nTesting batch stats and reports:")
+    for executor in ("process", "pipeline"):
+        stats = BatchStats()
+        batch_process_images(
+            str(input_dir), str(output_dir), top_pixels=8, executor=executor, stats=stats, report="json"
+        )
+        summary = stats.as_dict()
+        assert summary["statuses"] == {"ok": 3}
+        assert summary["megapixels"] == 3 * 400 * 300 / 1e6
+        assert summary["bytes_read"] > 0 and summary["bytes_written"] > 0
+        for stage in ("decode", "transform", "encode", "write"):
+            assert summary["stage_seconds"][stage] > 0, (executor, stage)
+        written = json.loads((output_dir / "image_cropper_report.json").read_text())
+        assert written["statuses"] == {"ok": 3}
+    
+    batch_process_images(str(input_dir), str(output_dir), top_pixels=8, report="csv")
+    with open(output_dir / "image_cropper_report.csv", newline="") as fp:
+        rows = list(csv.DictReader(fp))
+    assert len(rows) == 3
+    assert all(int(row["width"]) == 400 and float(row["encode"]) > 0 for row in rows)
+    print(f"✓ Stage shares: {summary['stage_share']}")
+
+
+def test_thumbnail_cache():
+    """Test preview proxies, LRU eviction by size and preview rendering."""
+    from preview import ThumbnailCache, render_preview
+    
+    test_dir = Path("test_input_preview")
+    test_dir.mkdir(exist_ok=True)
+    big = Image.new("RGB", (2000, 1600), (200, 30, 30))
+    ImageDraw.Draw(big).rectangle([0, 0, 1999, 199], fill=(0, 0, 255))
+    big.save(test_dir / "big.jpg", quality=90)
+    big.save(test_dir / "big.png")
+    
+    print("\nTesting preview thumbnail cache:")
+    cache = ThumbnailCache()
+    proxy, original_size = cache.get(test_dir / "big.jpg", (400, 400))
+    assert original_size == (2000, 1600)
+    assert proxy.width <= 400 and proxy.height <= 400
+    assert cache.get(test_dir / "big.jpg", (400, 400))[0] is proxy
+    assert (cache.hits, cache.misses) == (1, 1)
+    
+    # Room for roughly one 400x320 RGB proxy: the older entry is evicted
+    small_cache = ThumbnailCache(max_bytes=400 * 320 * 3)
+    small_cache.get(test_dir / "big.jpg", (400, 400))
+    small_cache.get(test_dir / "big.png", (400, 400))
+    assert len(small_cache) == 1 and small_cache.nbytes <= small_cache.max_bytes
+    small_cache.get(test_dir / "big.png", (400, 400))
+    assert small_cache.hits == 1
+    
+    before, after = render_preview(cache, test_dir / "big.png", 200, 0, 0, 0, (400, 400))
+    assert before.size == after.size == (400, 320)
+    # The blue top band (200 of 1600 rows) now sits at the bottom of the proxy
+    assert after.getpixel((200, 315))[2] > 200
+    assert after.getpixel((200, 160))[0] > 150 and before.getpixel((200, 315))[2] < 100
+    print(f"✓ Cached {len(cache)} proxies ({cache.nbytes} bytes) and rendered a before/after preview")
+
+
+def test_cli():
+    """Test the headless command-line front end."""
+    import contextlib
+    import json
+    import subprocess
+    import sys
+    import tarfile
+    import cli
+    
+    test_dir = Path("test_input_cli")
+    test_dir.mkdir(exist_ok=True)
+    create_test_images(str(test_dir))
+    
+    print("\nTesting command-line front end:")
+    # Importing the CLI must not pull in Tk, Pillow or the archive modules
+    probe = "import sys, cli; print(any(m in sys.modules for m in ('tkinter', 'PIL', 'tarfile', 'zipfile')))"
+    assert subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True).stdout.strip() == "False"
+    
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        code = cli.main([str(test_dir), "test_output_cli", "--top", "20", "--right", "10", "-f", "bmp", "--json"])
+    summary = json.loads(stdout.getvalue())
+    assert code == cli.EXIT_OK
+    assert summary["statuses"] == {"ok": 3} and summary["errors"] == []
+    assert sorted(p.name for p in Path("test_output_cli").glob("*.bmp")) == [
+        "test_blue.bmp", "test_green.bmp", "test_red.bmp"
+    ]
+    
+    # The broken file gets a folder of its own, so the run above still succeeds when repeated
+    broken_dir = Path("test_input_cli_broken")
+    create_test_images(str(broken_dir))
+    (broken_dir / "broken.png").write_bytes(b"not an image")
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        assert cli.main([str(broken_dir), "test_output_cli", "--top", "20", "-q"]) == cli.EXIT_FAILED_FILES
+        assert cli.main([str(test_dir), "test_output_cli", "--top", "-5"]) == cli.EXIT_USAGE
+        assert cli.main([str(test_dir), "test_output_cli", "-f", "nope"]) == cli.EXIT_USAGE
+        assert cli.main(["test_input_cli_missing", "test_output_cli"]) == cli.EXIT_NO_IMAGES
+        # A plain image is neither a folder nor an archive
+        assert cli.main([str(test_dir / "test_red.png"), "test_output_cli"]) == cli.EXIT_USAGE
+        # So is a truncated tarball
+        with tarfile.open(broken_dir / "bundle.tar.gz", "w:gz") as bundle:
+            bundle.add(test_dir / "test_red.png", "test_red.png")
+        data = (broken_dir / "bundle.tar.gz").read_bytes()
+        (broken_dir / "bundle.tar.gz").write_bytes(data[:len(data) // 2])
+        assert cli.main([str(broken_dir / "bundle.tar.gz"), "test_output_cli"]) == cli.EXIT_USAGE
+    print("✓ CLI wrote converted outputs, printed a JSON summary and returned the expected exit codes")
+
+
+def test_watch_folder():
+    """Test settle detection in the folder watcher and once-only watch processing."""
+    import os
+    import shutil
+    import threading
+    from watch import FolderWatcher, watch_images
+    
+    test_dir = Path("test_input_watch")
+    create_test_images(str(test_dir))
+    # The manifest from an earlier run would mark every file as done already
+    shutil.rmtree("test_output_watch", ignore_errors=True)
+    (test_dir / "empty.png").write_bytes(b"")
+    
+    print("\nTesting watch folder:")
+    scan = test_dir / "scan.png"
+    Image.new("RGB", (60, 40), "white").save(scan)
+    t = 1_700_000_000
+    os.utime(scan, (t, t))
+    watcher = FolderWatcher(test_dir, settle_seconds=2.0)
+    assert scan not in watcher.scan(now=t + 0.5)
+    ready = watcher.scan(now=t + 2.5)
+    assert scan in ready and test_dir / "empty.png" not in ready
+    for path in ready:
+        watcher.mark_done(path)
+    assert watcher.scan(now=t + 3) == []
+    
+    # A file that is still growing waits for a full settle period after its last change
+    with open(scan, "ab") as fp:
+        fp.write(b"\0" * 10)
+    os.utime(scan, (t + 10, t + 10))
+    assert watcher.scan(now=t + 10.5) == []
+    assert watcher.scan(now=t + 13) == [scan]
+    watcher.close()
+    
+    def run_until(count):
+        stop = threading.Event()
+        results = []
+        for result in watch_images(str(test_dir), "test_output_watch", top_pixels=5,
+                                   settle_seconds=0, poll_interval=0.01, stop_event=stop):
+            results.append(result)
+            if len(results) == count:
+                stop.set()
+        return results
+    
+    first = run_until(4)
+    assert {r.path.name for r in first} == {"test_red.png", "test_green.png", "test_blue.png", "scan.png"}
+    assert all(r.ok for r in first)
+    assert all(r.latency is not None and r.latency >= 0 for r in first)
+    # After a restart the manifest marks processed files as done
+    again = run_until(3)
+    assert {r.status for r in again} == {"skipped"}
+    print("✓ Waited for files to settle and processed each version once, across restarts")
+
+
+def test_encoder_profiles():
+    """Test encoder profiles, metadata preservation and the encoding report."""
+    from image_processor import BatchStats
+    
+    test_dir = Path("test_input_profiles")
+    test_dir.mkdir(exist_ok=True)
+    base = Image.new("RGB", (320, 240), (30, 90, 160))
+    ImageDraw.Draw(base).ellipse([20, 20, 300, 220], fill=(240, 200, 10))
+    exif = Image.Exif()
+    exif[0x010F] = "Test Scanner"  # Make
+    icc = b"fake-icc-profile"
+    base.save(test_dir / "photo.jpg", quality=95, exif=exif, icc_profile=icc)
+    base.save(test_dir / "drawing.png")
+    
+    print("\nTesting encoder profiles:")
+    sizes = {}
+    for profile in ("fast", "balanced", "smallest"):
+        output_dir = Path("test_output_profiles") / profile
+        stats = BatchStats()
+        successful, failed, errors = batch_process_images(
+            str(test_dir), str(output_dir), top_pixels=10, profile=profile, stats=stats
+        )
+        assert (successful, failed) == (2, 0), errors
+        encoding = stats.as_dict()["encoding"]
+        assert set(encoding) == {f"JPEG {profile}", f"PNG {profile}"}
+        assert all(entry["bytes_per_pixel"] > 0 for entry in encoding.values())
+        sizes[profile] = (output_dir / "drawing.png").stat().st_size
+        with Image.open(output_dir / "photo.jpg") as result:
+            assert result.getexif()[0x010F] == "Test Scanner"
+            assert result.info.get("icc_profile") == icc
+    assert sizes["smallest"] <= sizes["balanced"] <= sizes["fast"]
+    
+    # A CMYK profile must not follow the pixels into an RGB output
+    cmyk_dir = Path("test_input_profiles_cmyk")
+    cmyk_dir.mkdir(exist_ok=True)
+    base.convert("CMYK").save(cmyk_dir / "print.jpg", icc_profile=b"fake-cmyk-profile")
+    successful, failed, errors = batch_process_images(
+        str(cmyk_dir), "test_output_profiles/cmyk", top_pixels=10, output_format="png"
+    )
+    assert (successful, failed) == (1, 0), errors
+    with Image.open("test_output_profiles/cmyk/print.png") as result:
+        assert result.mode == "RGB" and "icc_profile" not in result.info
+    successful, failed, errors = batch_process_images(
+        str(cmyk_dir), "test_output_profiles/cmyk_rgb", top_pixels=10, preserve_mode=False
+    )
+    assert (successful, failed) == (1, 0), errors
+    with Image.open("test_output_profiles/cmyk_rgb/print.jpg") as result:
+        assert result.mode == "RGB" and "icc_profile" not in result.info
+    
+    try:
+        batch_process_images(str(test_dir), "test_output_profiles", profile="tiny")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown profile was accepted")
+    print(f"✓ PNG sizes by profile: {sizes}; EXIF and ICC kept")
+
+
+def test_cancel_and_resume():
+    """Test cancelling between files and resuming from the journal."""
+    import threading
+    
+    test_dir = Path("test_input_cancel")
+    output_dir = Path("test_output_cancel")
+    create_test_images(str(test_dir))
+    
+    print("\nTesting cancel and resume:")
+    cancel = threading.Event()
+    first = list(iter_process_images(
+        str(test_dir), str(output_dir), top_pixels=6,
+        progress_callback=lambda current, total, filename: cancel.set(),
+        cancel_event=cancel,
+    ))
+    assert len(first) == 1 and first[0].ok
+    
+    # The journal lets an incremental run pick up where the cancelled one stopped
+    second = {r.path.name: r.status for r in iter_process_images(
+        str(test_dir), str(output_dir), top_pixels=6, incremental=True
+    )}
+    assert second[first[0].path.name] == "skipped"
+    assert sorted(second.values()) == ["ok", "ok", "skipped"]
+    assert not list(output_dir.glob("*.partial")), "temporary outputs left behind"
+    print("✓ Cancelled after 1 file and resumed the remaining 2")
+
+
+def test_variants():
+    """Test decoding once and writing several named variants."""
+    from image_processor import Variant
+    
+    test_dir = Path("test_input_variants")
+    output_dir = Path("test_output_variants")
+    create_test_images(str(test_dir))
+    
+    print("\nTesting multi-variant output:")
+    variants = [
+        Variant("top", top_pixels=20),
+        Variant("sides", left_pixels=15, right_pixels=5),
+        {"name": "thumb", "bottom_pixels": 10, "resize": (100, 100)},
+    ]
+    for executor in ("process", "pipeline"):
+        results = list(iter_process_images(str(test_dir), str(output_dir), variants=variants, executor=executor))
+        assert len(results) == 3 and all(r.ok for r in results)
+        for name, variant in (("top", variants[0]), ("sides", variants[1])):
+            for path in test_dir.glob("*.png"):
+                expected = crop_and_mirror(
+                    str(path), variant.top_pixels, variant.bottom_pixels, variant.left_pixels, variant.right_pixels
+                )
+                with Image.open(output_dir / name / path.name) as result:
+                    assert result.tobytes() == expected.tobytes(), (executor, name, path.name)
+        with Image.open(output_dir / "thumb" / "test_red.png") as thumb:
+            assert max(thumb.size) == 100
+    
+    # Incremental runs reprocess a file when any of its variant outputs is missing
+    (output_dir / "sides" / "test_red.png").unlink()
+    statuses = {r.path.name: r.status for r in iter_process_images(
+        str(test_dir), str(output_dir), variants=variants, incremental=True
+    )}
+    assert statuses == {"test_red.png": "ok", "test_green.png": "skipped", "test_blue.png": "skipped"}
+    
+    for bad in ([Variant("a"), Variant("a")], [Variant("../up")]):
+        try:
+            list(iter_process_images(str(test_dir), str(output_dir), variants=bad))
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid variants accepted: {bad}")
+    print("✓ Wrote 3 variants per image from a single decode")
+
+
+def test_archives():
+    """Test streaming images between ZIP/TAR archives and folders."""
+    import tarfile
+    import zipfile
+    from archives import iter_process_archive
+    
+    test_dir = Path("test_input_archive")
+    output_dir = Path("test_output_archive")
+    create_test_images(str(test_dir / "scans"))
+    output_dir.mkdir(exist_ok=True)
+    with zipfile.ZipFile(test_dir / "bundle.zip", "w") as bundle:
+        for path in sorted((test_dir / "scans").glob("*.png")):
+            bundle.write(path, f"scans/{path.name}")
+        bundle.writestr("notes.txt", "not an image")
+        bundle.writestr("../escape.png", (test_dir / "scans" / "test_red.png").read_bytes())
+    
+    print("\nTesting archive input and output:")
+    results = list(iter_process_archive(test_dir / "bundle.zip", output_dir / "out.tar.gz", top_pixels=12, workers=2))
+    statuses = {r.path.as_posix(): r.status for r in results}
+    assert statuses == {
+        "scans/test_red.png": "ok", "scans/test_green.png": "ok", "scans/test_blue.png": "ok",
+        "../escape.png": "failed",
+    }
+    with tarfile.open(output_dir / "out.tar.gz") as tarball:
+        assert sorted(tarball.getnames()) == ["scans/test_blue.png", "scans/test_green.png", "scans/test_red.png"]
+        data = tarball.extractfile("scans/test_red.png").read()
+    expected = crop_and_mirror(str(test_dir / "scans" / "test_red.png"), 12)
+    assert Image.open(io.BytesIO(data)).tobytes() == expected.tobytes()
+    
+    # Tarball back into a zip, converting formats on the way
+    list(iter_process_archive(output_dir / "out.tar.gz", output_dir / "again.zip", output_format="bmp"))
+    with zipfile.ZipFile(output_dir / "again.zip") as bundle:
+        assert sorted(bundle.namelist()) == ["scans/test_blue.bmp", "scans/test_green.bmp", "scans/test_red.bmp"]
+        assert bundle.getinfo("scans/test_red.bmp").compress_type == zipfile.ZIP_DEFLATED
+    assert not list(output_dir.glob(".*.partial")), "temporary archive left behind"
+    print("✓ Streamed zip -> tar.gz -> zip without extracting to disk")
+
+
+def test_multiframe():
+    """Test that every frame of animated GIFs and multi-page TIFFs is processed."""
+    from image_processor import BatchStats
+    
+    test_dir = Path("test_input_frames")
+    output_dir = Path("test_output_frames")
+    test_dir.mkdir(exist_ok=True)
+    palette = [0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255]
+    frames = []
+    for idx in range(3):
+        frame = Image.new("P", (40, 30), 0)
+        frame.putpalette(palette)
+        frame.paste(idx + 1, (0, 0, 10, 30))
+        frames.append(frame)
+    frames[0].save(test_dir / "anim.gif", save_all=True, append_images=frames[1:],
+                   duration=[100, 200, 300], disposal=[1, 2, 1], loop=0)
+    pages = [Image.new("L", (64, 48), 60 * idx) for idx in range(4)]
+    pages[0].save(test_dir / "doc.tiff", save_all=True, append_images=pages[1:])
+    
+    print("\nTesting multi-frame processing:")
+    stats = BatchStats()
+    results = {r.path.name: r for r in iter_process_images(str(test_dir), str(output_dir), left_pixels=10, stats=stats)}
+    assert results["anim.gif"].frames == 3 and results["doc.tiff"].frames == 4
+    assert stats.as_dict()["frames"] == 7
+    
+    anim = Image.open(output_dir / "anim.gif")
+    assert anim.n_frames == 3
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+    for idx in range(3):
+        anim.seek(idx)
+        assert anim.info["duration"] == 100 * (idx + 1)
+        assert anim.disposal_method == [1, 2, 1][idx]
+        # The left band moved to the right edge of every frame
+        assert anim.convert("RGB").getpixel((35, 15)) == colors[idx]
+        assert anim.convert("RGB").getpixel((20, 15)) == (0, 0, 0)
+    print("✓ GIF keeps all frames, durations and disposal")
+    
+    doc = Image.open(output_dir / "doc.tiff")
+    assert doc.n_frames == 4
+    for idx in range(4):
+        doc.seek(idx)
+        assert doc.mode == "L" and doc.getpixel((63, 0)) == 60 * idx
+    print("✓ Multi-page TIFF written page by page")
+    
+    # Converting an animation gives every frame one mode, or keeps just the first frame
+    for output_format, n_frames in (("png", 3), ("jpg", 1)):
+        converted = output_dir / output_format
+        results = list(iter_process_images(str(test_dir), str(converted), left_pixels=10, output_format=output_format))
+        assert all(r.ok for r in results), [r.error for r in results]
+        with Image.open(converted / f"anim.{output_format}") as anim:
+            assert getattr(anim, "n_frames", 1) == n_frames
+            anim.seek(n_frames - 1)
+            pixel = anim.convert("RGB").getpixel((35, 15))
+            assert all(abs(a - b) <= 8 for a, b in zip(pixel, colors[n_frames - 1]))  # JPEG is lossy
+    print("✓ GIF converts to an animated PNG or a single-frame JPEG")
+    
+    # Archive members and uploads are encoded in memory, frames and all
+    from archives import _process_member
+    from server import _process_bytes
+    options = {"top_pixels": 0, "bottom_pixels": 0, "left_pixels": 10, "right_pixels": 0,
+               "backend": "pillow", "preserve_mode": True}
+    result, outputs = _process_member("scans/doc.tiff", (test_dir / "doc.tiff").read_bytes(), options)
+    assert result.ok and result.frames == 4 and result.bytes_written == len(outputs[0][1])
+    assert Image.open(io.BytesIO(outputs[0][1])).n_frames == 4
+    data, format = _process_bytes((test_dir / "anim.gif").read_bytes(), {"left_pixels": 10, "profile": "balanced"})
+    assert format == "GIF" and data == (output_dir / "anim.gif").read_bytes()
+    data, format = _process_bytes((test_dir / "anim.gif").read_bytes(), {"format": "PNG", "profile": "balanced"})
+    assert format == "PNG" and Image.open(io.BytesIO(data)).n_frames == 3
+    print("✓ Archive members and server uploads keep every frame")
+
+
+def test_server():
+    """Test the local HTTP service, its backpressure and metrics."""
+    import http.client
+    import json
+    import threading
+    import urllib.error
+    import urllib.request
+    from server import ProcessingService, make_server
+    
+    img = Image.new("RGB", (80, 60), "red")
+    img.paste((0, 0, 255), (0, 0, 80, 10))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    data = buffer.getvalue()
+    
+    print("\nTesting HTTP service:")
+    with ProcessingService(workers=1, max_pending=1) as service:
+        service.warm()
+        server = make_server(service, port=0)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(f"{url}/process?top=10", data=data))
+            assert response.headers["Content-Type"] == "image/png"
+            assert response.read() == transform_image(data, 10)
+            print("✓ POST /process returns the processed image")
+            
+            for query, body in [("top=-1", data), ("top=1", b"not an image")]:
+                try:
+                    urllib.request.urlopen(urllib.request.Request(f"{url}/process?{query}", data=body))
+                    assert False, "expected an error response"
+                except urllib.error.HTTPError as e:
+                    assert e.code == 400
+            
+            # Hold the only slot, as a request in progress would
+            service._slots.acquire()
+            try:
+                try:
+                    urllib.request.urlopen(urllib.request.Request(f"{url}/process", data=data))
+                    assert False, "expected 503 while busy"
+                except urllib.error.HTTPError as e:
+                    assert e.code == 503 and e.headers["Retry-After"]
+                # Refused before the body is read: announce a large body, send none
+                conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+                try:
+                    conn.putrequest("POST", "/process")
+                    conn.putheader("Content-Length", str(64 * 1024 * 1024))
+                    conn.endheaders()
+                    response = conn.getresponse()
+                    assert response.status == 503 and response.getheader("Connection") == "close"
+                finally:
+                    conn.close()
+            finally:
+                service._slots.release()
+            print("✓ Bad requests get 400, excess requests get 503 without their body being read")
+            
+            metrics = json.loads(urllib.request.urlopen(f"{url}/metrics").read())
+            assert metrics["responses"] == {"200": 1, "400": 2, "503": 2}
+            assert metrics["in_flight"] == 0 and metrics["latency_ms"]["count"] == 2
+            print("✓ /metrics reports responses, latency and queue depth")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def test_async_api():
+    """Test the asyncio API: limits, shared semaphores and cancellation."""
+    import asyncio
+    import threading
+    from async_processor import aiter_process_images, batch_process_images_async, crop_and_mirror_async
+    
+    test_dir = Path("test_input_async")
+    create_test_images(str(test_dir), count=3)
+    
+    async def run():
+        print("\nTesting asyncio API:")
+        image = await crop_and_mirror_async(str(test_dir / "test_red.png"), 20)
+        assert image.tobytes() == crop_and_mirror(str(test_dir / "test_red.png"), 20).tobytes()
+        
+        results = [r async for r in aiter_process_images(str(test_dir), "test_output_async", top_pixels=20, limit=2)]
+        assert sorted(r.path.name for r in results if r.ok) == ["test_blue.png", "test_green.png", "test_red.png"]
+        print("✓ Async iteration processes every file")
+        
+        # Two calls sharing one semaphore, the second skipping unchanged files
+        semaphore = asyncio.Semaphore(1)
+        first, second = await asyncio.gather(
+            batch_process_images_async(str(test_dir), "test_output_async_2", top_pixels=20, semaphore=semaphore),
+            batch_process_images_async(str(test_dir), "test_output_async", top_pixels=20, semaphore=semaphore,
+                                       incremental=True),
+        )
+        assert first == (3, 0, []) and second == (3, 0, [])
+        print("✓ Shared semaphore and incremental runs")
+        
+        cancel_event = threading.Event()
+        seen = []
+        async for result in aiter_process_images(str(test_dir), "test_output_async_3", limit=1,
+                                                 cancel_event=cancel_event):
+            seen.append(result)
+            cancel_event.set()
+        assert len(seen) < 3
+        print("✓ Cancelling stops new files from starting")
+    
+    asyncio.run(run())
+
+
+def test_sharding():
+    """Test splitting a batch into shards and merging their manifests and reports."""
+    import json
+    from image_processor import shard_of
+    from merge_shards import merge_shards
+    
+    test_dir = Path("test_input_shards")
+    output_dir = Path("test_output_shards")
+    test_dir.mkdir(exist_ok=True)
+    for idx in range(12):
+        Image.new("RGB", (40, 30), (idx * 20, 0, 0)).save(test_dir / f"img_{idx}.png")
+    
+    print("\nTesting sharding:")
+    assert shard_of("sub/img.png", 4) == shard_of(Path("sub") / "img.png", 4)
+    seen = []
+    for shard_index in range(3):
+        for result in iter_process_images(str(test_dir), str(output_dir), top_pixels=5, report="json",
+                                          shard_index=shard_index, shard_count=3):
+            assert shard_of(result.path.name, 3) == shard_index
+            seen.append(result.path.name)
+    assert sorted(seen) == sorted(f"img_{idx}.png" for idx in range(12))
+    assert (output_dir / ".image_cropper_manifest.shard-1-of-3.jsonl").exists()
+    print("✓ Shards are disjoint and cover every file")
+    
+    summary = merge_shards(output_dir)
+    assert summary["files"] == 12 and summary["manifest_entries"] == 12
+    assert summary["shards"] == {"merged": ["0/3", "1/3", "2/3"], "missing": []}
+    assert json.loads((output_dir / "image_cropper_report.json").read_text())["files"] == 12
+    assert not list(output_dir.glob(".image_cropper_manifest.shard-*"))
+    
+    # The merged manifest lets a later run skip everything, sharded or not
+    results = list(iter_process_images(str(test_dir), str(output_dir), top_pixels=5, incremental=True))
+    assert {r.status for r in results} == {"skipped"}
+    print("✓ Merged reports and manifests into one summary")
+
+
 if __name__ == "__main__":
     print("Image Processor Test Suite")
     print("=" * 50)
@@ -104,6 +1007,29 @@ if __name__ == "__main__":
     try:
         test_crop_and_mirror()
         test_batch_process()
+        test_batch_process_parallel()
+        test_iter_process_images()
+        test_transform_image_in_memory()
+        test_numpy_backend()
+        test_mode_preserved()
+        test_incremental_rerun()
+        test_lossless_jpeg_fallback()
+        test_recursive_discovery()
+        test_pipeline_executor()
+        test_band_stream()
+        test_benchmark_smoke()
+        test_batch_stats_and_reports()
+        test_thumbnail_cache()
+        test_cli()
+        test_watch_folder()
+        test_encoder_profiles()
+        test_cancel_and_resume()
+        test_variants()
+        test_archives()
+        test_multiframe()
+        test_server()
+        test_async_api()
+        test_sharding()
         print("\n" + "=" * 50)
         print("All tests completed successfully!")
     except Exception as e:
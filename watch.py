@@ -0,0 +1,245 @@
+"""Watch a hot folder and process images as they arrive.
+
+A FolderWatcher keeps a stat cache of the input folder and reports a file
+as ready once its size and mtime have stopped changing for a settle
+period, so half-copied scans are never picked up. watch_images feeds the
+ready files through the same engine as iter_process_images, in small
+oldest-first batches, and records each one in the manifest so it is
+processed exactly once, even across restarts.
+
+On Linux, installing inotify_simple lets the watcher wake as soon as a
+file is closed or moved into the top-level folder instead of waiting for
+the next poll; subfolders are always polled.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+from image_processor import (
+    DEFAULT_PROFILE,
+    BatchStats,
+    ProcessManifest,
+    ProcessResult,
+    _batch_options,
+    _iter_results,
+    discover_images,
+)
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # Optional; also unavailable off Linux
+    INotify = None
+
+
+class FolderWatcher:
+    """
+    Stat cache of a folder that reports files once they stop changing.
+
+    A file is ready when its (size, mtime) has been unchanged for
+    settle_seconds. Files already older than that when first seen are ready
+    immediately. Each version of a file is reported once; a file is
+    reported again only after it changes.
+    """
+
+    def __init__(
+        self,
+        input_folder,
+        extensions: list = None,
+        recursive: bool = False,
+        exclude=None,
+        settle_seconds: float = 2.0,
+    ):
+        self.input_path = Path(input_folder)
+        self.extensions = extensions
+        self.recursive = recursive
+        self.exclude = exclude
+        self.settle_seconds = settle_seconds
+        # path -> (size, mtime_ns, time the current version was first seen)
+        self._seen = {}
+        # path -> (size, mtime_ns) last reported as ready
+        self._reported = {}
+        self._next_ready = None
+        self._inotify = None
+        if INotify is not None:
+            self._inotify = INotify()
+            self._inotify.add_watch(
+                str(self.input_path),
+                inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def scan(self, now: float = None) -> list:
+        """
+        Stat every matching file and return those that have become ready.
+
+        Args:
+            now: Current time.time(); defaults to the real clock
+
+        Returns:
+            List of ready paths, the longest-settled first
+        """
+        now = time.time() if now is None else now
+        ready = []
+        present = set()
+        self._next_ready = None
+        for path in discover_images(self.input_path, self.extensions, self.recursive, self.exclude):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Removed between listing and stat
+            present.add(path)
+            version = (stat.st_size, stat.st_mtime_ns)
+            seen = self._seen.get(path)
+            if seen is None or seen[:2] != version:
+                # A new version: treat its mtime as the change time so files
+                # that were finished long ago need no extra wait
+                changed = min(now, stat.st_mtime_ns / 1e9) if seen is None else now
+                seen = self._seen[path] = (*version, changed)
+            if self._reported.get(path) == version or stat.st_size == 0:
+                continue
+            ready_at = seen[2] + self.settle_seconds
+            if ready_at <= now:
+                ready.append((seen[2], path))
+            elif self._next_ready is None or ready_at < self._next_ready:
+                self._next_ready = ready_at
+
+        # Forget deleted files so a new file at the same path is picked up
+        for path in set(self._seen) - present:
+            del self._seen[path]
+            self._reported.pop(path, None)
+        return [path for _, path in sorted(ready)]
+
+    def mark_done(self, path: Path) -> None:
+        """Record that the current version of path has been handled."""
+        seen = self._seen.get(path)
+        if seen is not None:
+            self._reported[path] = seen[:2]
+
+    def changed_since(self, path: Path, since: float) -> float:
+        """Return seconds between path's last observed change and since."""
+        seen = self._seen.get(path)
+        return since - seen[2] if seen is not None else 0.0
+
+    def wait(self, timeout: float, stop_event: threading.Event = None) -> None:
+        """
+        Sleep until the next scan is due.
+
+        Returns early when a pending file is due to settle, when inotify
+        reports a new file, or when stop_event is set.
+        """
+        if self._next_ready is not None:
+            timeout = min(timeout, max(0.0, self._next_ready - time.time()))
+        if self._inotify is None:
+            if stop_event is not None:
+                stop_event.wait(timeout)
+            else:
+                time.sleep(timeout)
+            return
+
+        # Read inotify in short slices so stop_event is still noticed
+        deadline = time.time() + timeout
+        while not (stop_event is not None and stop_event.is_set()):
+            remaining = deadline - time.time()
+            if remaining <= 0 or self._inotify.read(timeout=int(min(remaining, 0.5) * 1000)):
+                return
+
+    def close(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def watch_images(
+    input_folder: str,
+    output_folder: str,
+    top_pixels: int = 0,
+    bottom_pixels: int = 0,
+    left_pixels: int = 0,
+    right_pixels: int = 0,
+    extensions: list = None,
+    workers: int = 1,
+    executor: str = "thread",
+    backend: str = "pillow",
+    preserve_mode: bool = True,
+    hash_contents: bool = False,
+    lossless_jpeg: bool = False,
+    recursive: bool = False,
+    large_images: bool = False,
+    output_format: str = None,
+    profile: str = DEFAULT_PROFILE,
+    variants: list = None,
+    settle_seconds: float = 2.0,
+    poll_interval: float = 1.0,
+    max_batch: int = None,
+    stats: BatchStats = None,
+    stop_event: threading.Event = None,
+) -> Iterator[ProcessResult]:
+    """
+    Watch input_folder and process each new or modified image once.
+
+    Runs until stop_event is set (or the caller stops iterating). Ready
+    files are processed in batches of at most max_batch, oldest first, and
+    the folder is rescanned between batches, so a burst of arrivals cannot
+    hold back files that land after it for long.
+
+    Args:
+        input_folder: Folder to watch
+        output_folder: Path to output folder for processed images
+        top_pixels: Pixels to crop from top
+        bottom_pixels: Pixels to crop from bottom
+        left_pixels: Pixels to crop from left
+        right_pixels: Pixels to crop from right
+        extensions: List of file extensions to process (default: common image formats)
+        workers: Number of files to process concurrently (None uses all CPUs)
+        executor: "thread" (default; no pool start-up cost per batch),
+            "process" or "pipeline"
+        settle_seconds: How long a file's size and mtime must stay unchanged
+            before it is processed
+        poll_interval: Seconds between scans while nothing is ready
+        max_batch: Most files per batch (default: 4 per worker)
+        stats: BatchStats to add every result to
+        stop_event: threading.Event that ends the watch when set
+
+        The remaining options are described in iter_process_images.
+
+    Yields:
+        ProcessResult for each processed file, with latency set to the
+        seconds from the file's last observed change to its result
+    """
+    input_path = Path(input_folder)
+    output_path = Path(output_folder)
+    output_path.mkdir(parents=True, exist_ok=True)
+    options = _batch_options(
+        top_pixels, bottom_pixels, left_pixels, right_pixels,
+        backend, preserve_mode, lossless_jpeg, large_images, output_format, profile, variants,
+    )
+    if max_batch is None:
+        max_batch = 4 * (workers or os.cpu_count() or 1)
+
+    # The manifest is what makes "once" survive a restart of the watcher
+    manifest = ProcessManifest(input_path, output_path, hash_contents)
+    watcher = FolderWatcher(input_path, extensions, recursive, exclude=output_path, settle_seconds=settle_seconds)
+    try:
+        while stop_event is None or not stop_event.is_set():
+            batch = watcher.scan()[:max_batch]
+            if not batch:
+                watcher.wait(poll_interval, stop_event)
+                continue
+            for result in _iter_results(batch, input_path, output_path, options, workers, executor, manifest):
+                watcher.mark_done(result.path)
+                result.latency = watcher.changed_since(result.path, time.time())
+                if stats is not None:
+                    stats.add(result)
+                yield result
+    finally:
+        watcher.close()
+        manifest.close()
+        if stats is not None:
+            stats.finish()